@@ -0,0 +1,186 @@
+from dataclasses import dataclass
+import hashlib
+from pathlib import Path
+
+from codeq.main import CodeKind, CodePart, Codeq, CodeqError
+
+
+class ExternalModificationError(CodeqError):
+    """Raised when a file with unflushed session edits was changed on disk."""
+
+
+@dataclass
+class _SessionEntry:
+    codeq: Codeq
+    mtime_ns: int
+    size: int
+    digest: str
+    dirty: bool = False
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class CodeqSession:
+    """Codeq instances kept open for the lifetime of an agent session.
+
+    Files are parsed once and reused across tool calls. A file changed on
+    disk is reloaded, unless the session holds unflushed edits for it.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[Path, _SessionEntry] = {}
+        self.loads = 0
+        self.hits = 0
+
+    def __enter__(self) -> "CodeqSession":
+        return self
+
+    def __exit__(self, exc_type: object, *_exc: object) -> None:
+        if exc_type is None:
+            self.flush()
+
+    def open(self, file_path: str | Path) -> Codeq:
+        key = Path(file_path).resolve()
+        entry = self._entries.get(key)
+
+        if entry is not None and not self._changed_on_disk(key, entry):
+            self.hits += 1
+            return entry.codeq
+
+        if entry is not None and entry.dirty:
+            raise ExternalModificationError(
+                f"{key} was modified outside the session and has unflushed edits"
+            )
+
+        return self._load(key).codeq
+
+    def mark_dirty(self, file_path: str | Path) -> None:
+        self._entry(file_path).dirty = True
+
+    def is_dirty(self, file_path: str | Path) -> bool:
+        entry = self._entries.get(Path(file_path).resolve())
+
+        return entry is not None and entry.dirty
+
+    def flush(self, file_path: str | Path | None = None) -> list[Path]:
+        if file_path is None:
+            keys = [key for key, entry in self._entries.items() if entry.dirty]
+        else:
+            keys = [Path(file_path).resolve()] if self.is_dirty(file_path) else []
+
+        written: list[Path] = []
+        for key in keys:
+            entry = self._entries[key]
+            if self._changed_on_disk(key, entry):
+                raise ExternalModificationError(
+                    f"{key} was modified outside the session; refusing to overwrite"
+                )
+
+            entry.codeq.overwrite_file(key)
+            self._remember_stat(key, entry, bytes(entry.codeq.source_bytes))
+            entry.dirty = False
+            written.append(key)
+
+        return written
+
+    def discard(self, file_path: str | Path | None = None) -> None:
+        if file_path is None:
+            self._entries.clear()
+            return
+
+        self._entries.pop(Path(file_path).resolve(), None)
+
+    def _entry(self, file_path: str | Path) -> _SessionEntry:
+        key = Path(file_path).resolve()
+        if key not in self._entries:
+            raise KeyError(f"{key} is not open in this session")
+
+        return self._entries[key]
+
+    def _load(self, key: Path) -> _SessionEntry:
+        # Stat first: a write racing the read then shows up as a changed mtime.
+        stat = key.stat()
+        data = key.read_bytes()
+        codeq = Codeq.from_source(data.decode("utf-8"), str(key))
+
+        entry = _SessionEntry(
+            codeq=codeq, mtime_ns=stat.st_mtime_ns, size=stat.st_size, digest=_digest(data)
+        )
+        self._entries[key] = entry
+        self.loads += 1
+
+        return entry
+
+    def _changed_on_disk(self, key: Path, entry: _SessionEntry) -> bool:
+        try:
+            stat = key.stat()
+        except FileNotFoundError:
+            return True
+
+        if stat.st_mtime_ns == entry.mtime_ns and stat.st_size == entry.size:
+            return False
+
+        # mtime alone is noisy (touch, checkouts); only content changes count.
+        if stat.st_size == entry.size and _digest(key.read_bytes()) == entry.digest:
+            entry.mtime_ns = stat.st_mtime_ns
+            return False
+
+        return True
+
+    def _remember_stat(self, key: Path, entry: _SessionEntry, data: bytes) -> None:
+        stat = key.stat()
+        entry.mtime_ns = stat.st_mtime_ns
+        entry.size = stat.st_size
+        entry.digest = _digest(data)
+
+
+class CodeEditAgent:
+    def __init__(
+        self,
+        target_file: str | Path,
+        session: CodeqSession | None = None,
+    ) -> None:
+        self.target_file = Path(target_file)
+        self.session = session if session is not None else CodeqSession()
+
+    def file_map(self) -> list[str]:
+        return self.session.open(self.target_file).file_map()
+
+    def retrieve(
+        self,
+        kind: str | CodeKind,
+        target: str,
+        what: str | CodePart,
+    ) -> str | None:
+        return self.session.open(self.target_file).retrieve(kind, target, what)
+
+    def replace(
+        self,
+        kind: str | CodeKind,
+        target: str,
+        what: str | CodePart,
+        new_text: str,
+        validate: bool = True,
+    ) -> None:
+        self.session.open(self.target_file).replace(
+            kind, target, what, new_text, validate=validate
+        )
+        self.session.mark_dirty(self.target_file)
+
+    def add_import(self, import_stmt: str) -> bool:
+        changed = self.session.open(self.target_file).add_import(import_stmt)
+        if changed:
+            self.session.mark_dirty(self.target_file)
+
+        return changed
+
+    def flush(self) -> list[Path]:
+        return self.session.flush(self.target_file)
+
+    def apply_logic_patch(self, target: str, new_logic: str) -> str:
+        self.replace(CodeKind.FUNC, target, CodePart.LOGIC, new_logic)
+        self.flush()
+
+        return self.session.open(self.target_file).source_bytes.decode()
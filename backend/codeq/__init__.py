@@ -1,3 +1,4 @@
-from .main import Codeq, CodeKind, CodePart
+from .main import AmbiguousTargetError, Codeq, CodeKind, CodePart
+from .scheduler import CodemodScheduler
 
-__all__ = ["Codeq", "CodeKind", "CodePart", "AmbiguousTargetError"]
+__all__ = ["Codeq", "CodeKind", "CodePart", "AmbiguousTargetError", "CodemodScheduler"]
@@ -0,0 +1,212 @@
+from dataclasses import dataclass, field, fields
+import json
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, Iterator, TextIO
+
+from .main import (
+    NO_LIMITS,
+    ClassSpec,
+    Codeq,
+    CodeqObject,
+    FunctionSpec,
+    ParseLimitError,
+    ParseLimits,
+    ParseStatus,
+    ResourceKind,
+)
+
+BINARY_MAGIC = b"CQB1"
+
+# Binary records are positional JSON arrays; these fix the field order.
+_META_FIELDS = ("name", "path", "offset", "line", "column")
+_SPEC_FIELDS = {
+    ResourceKind.FUNCTION: tuple(field.name for field in fields(FunctionSpec)),
+    ResourceKind.CLASS: tuple(field.name for field in fields(ClassSpec)),
+}
+_KIND_CODES = {ResourceKind.FUNCTION: 0, ResourceKind.CLASS: 1}
+_CODE_KINDS = {code: kind for kind, code in _KIND_CODES.items()}
+
+
+@dataclass
+class IndexReport:
+    files: int = 0
+    partial: int = 0
+    skipped: int = 0
+    skipped_paths: dict[str, str] = field(default_factory=dict)
+
+    def record(self, path: str, status: ParseStatus, reason: str = "") -> None:
+        self.files += 1
+
+        if status is ParseStatus.PARTIAL:
+            self.partial += 1
+
+        elif status is ParseStatus.SKIPPED:
+            self.skipped += 1
+            self.skipped_paths[path] = reason
+
+    def summary(self) -> str:
+        return f"{self.files} files, {self.partial} partial, {self.skipped} skipped"
+
+
+def _camel(name: str) -> str:
+    head, *tail = name.split("_")
+
+    return head + "".join(part.title() for part in tail)
+
+
+def resource_to_dict(resource: CodeqObject, path: str | None = None) -> dict[str, Any]:
+    metadata: dict[str, Any] = {"name": resource.metadata.name}
+    if path is not None:
+        metadata["path"] = path
+
+    metadata.update(
+        offset=resource.metadata.offset,
+        line=resource.metadata.line,
+        column=resource.metadata.column,
+    )
+
+    return {
+        "apiVersion": resource.api_version,
+        "kind": resource.kind.value,
+        "metadata": metadata,
+        "spec": {
+            _camel(field.name): getattr(resource.spec, field.name)
+            for field in fields(resource.spec)
+        },
+    }
+
+
+def iter_file_resources(codeq: Codeq) -> Iterator[dict[str, Any]]:
+    for resource in codeq.iter_objects():
+        yield resource_to_dict(resource, codeq.path)
+
+
+def iter_project_resources(
+    root: str | Path,
+    pattern: str = "*.py",
+    limits: ParseLimits = NO_LIMITS,
+    report: IndexReport | None = None,
+) -> Iterator[dict[str, Any]]:
+    root_path = Path(root)
+    paths = [root_path] if root_path.is_file() else sorted(root_path.rglob(pattern))
+
+    for path in paths:
+        if not path.is_file():
+            continue
+
+        try:
+            codeq = Codeq.from_file(path, limits)
+
+        except ParseLimitError as exc:
+            if report is not None:
+                report.record(str(path), ParseStatus.SKIPPED, exc.reason)
+
+            continue
+
+        except (OSError, UnicodeDecodeError) as exc:
+            if report is not None:
+                report.record(str(path), ParseStatus.SKIPPED, type(exc).__name__)
+
+            continue
+
+        if report is not None:
+            report.record(codeq.path, codeq.status)
+
+        yield from iter_file_resources(codeq)
+
+
+def write_ndjson(resources: Iterable[dict[str, Any]], stream: TextIO) -> int:
+    count = 0
+    for resource in resources:
+        stream.write(json.dumps(resource, separators=(",", ":"), ensure_ascii=False))
+        stream.write("\n")
+        count += 1
+
+    return count
+
+
+def read_ndjson(stream: TextIO) -> Iterator[dict[str, Any]]:
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _write_varint(stream: BinaryIO, value: int) -> None:
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            stream.write(bytes((byte | 0x80,)))
+        else:
+            stream.write(bytes((byte,)))
+            return
+
+
+def _read_varint(stream: BinaryIO) -> int | None:
+    value = 0
+    shift = 0
+    while True:
+        raw = stream.read(1)
+        if not raw:
+            if shift:
+                raise ValueError("Truncated record length")
+
+            return None
+
+        value |= (raw[0] & 0x7F) << shift
+        if not raw[0] & 0x80:
+            return value
+
+        shift += 7
+
+
+def write_binary(resources: Iterable[dict[str, Any]], stream: BinaryIO) -> int:
+    """Write resources as varint-length-prefixed positional JSON records."""
+    stream.write(BINARY_MAGIC)
+
+    count = 0
+    for resource in resources:
+        kind = ResourceKind(resource["kind"])
+        metadata = resource["metadata"]
+        spec = resource["spec"]
+        record = [
+            _KIND_CODES[kind],
+            *(metadata.get(name) for name in _META_FIELDS),
+            *(spec[_camel(name)] for name in _SPEC_FIELDS[kind]),
+        ]
+        payload = json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode()
+
+        _write_varint(stream, len(payload))
+        stream.write(payload)
+        count += 1
+
+    return count
+
+
+def read_binary(stream: BinaryIO) -> Iterator[dict[str, Any]]:
+    if stream.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+        raise ValueError("Not a codeq binary export")
+
+    while (length := _read_varint(stream)) is not None:
+        payload = stream.read(length)
+        if len(payload) != length:
+            raise ValueError("Truncated record")
+
+        code, *values = json.loads(payload)
+        kind = _CODE_KINDS[code]
+        meta_values = values[: len(_META_FIELDS)]
+        spec_values = values[len(_META_FIELDS) :]
+
+        yield {
+            "apiVersion": "codeq/v1",
+            "kind": kind.value,
+            "metadata": {
+                name: value
+                for name, value in zip(_META_FIELDS, meta_values)
+                if value is not None
+            },
+            "spec": {
+                _camel(name): value
+                for name, value in zip(_SPEC_FIELDS[kind], spec_values)
+            },
+        }
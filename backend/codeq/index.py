@@ -0,0 +1,299 @@
+from dataclasses import dataclass, field
+import hashlib
+import json
+from pathlib import Path, PurePosixPath
+import shutil
+import tempfile
+from typing import Any, Iterable, Iterator, TextIO
+import zlib
+
+from .export import IndexReport, resource_to_dict
+from .main import (
+    NO_LIMITS,
+    Codeq,
+    CodeqError,
+    ParseLimitError,
+    ParseLimits,
+    ParseStatus,
+)
+
+API_VERSION = "codeq/v1"
+SHARD_KIND = "IndexShard"
+INDEX_KIND = "Index"
+
+
+class IndexFormatError(CodeqError):
+    """Raised when a shard or index file is malformed or has the wrong version."""
+
+
+@dataclass(frozen=True)
+class FileRecord:
+    path: str
+    sha256: str
+    status: str
+    resources: list[dict[str, Any]]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "path": self.path,
+            "sha256": self.sha256,
+            "status": self.status,
+            "resources": self.resources,
+        }
+
+
+@dataclass
+class MergeReport:
+    shards: int = 0
+    files: int = 0
+    duplicates: int = 0
+    conflicts: dict[str, list[str]] = field(default_factory=dict)
+    parse_report: IndexReport = field(default_factory=IndexReport)
+
+
+def shard_for(relative_path: str, shards: int) -> int:
+    """Assign a file to a shard by its directory, stable across machines."""
+    directory = str(PurePosixPath(relative_path).parent)
+
+    return zlib.crc32(directory.encode()) % shards
+
+
+def _relative_paths(root: Path, pattern: str) -> list[str]:
+    return sorted(
+        path.relative_to(root).as_posix()
+        for path in root.rglob(pattern)
+        if path.is_file()
+    )
+
+
+def iter_shard_records(
+    root: str | Path,
+    shard: int,
+    shards: int,
+    pattern: str = "*.py",
+    limits: ParseLimits = NO_LIMITS,
+    report: IndexReport | None = None,
+) -> Iterator[FileRecord]:
+    if not 0 <= shard < shards:
+        raise ValueError(f"Shard {shard} is out of range for {shards} shards")
+
+    root_path = Path(root)
+    for relative in _relative_paths(root_path, pattern):
+        if shard_for(relative, shards) != shard:
+            continue
+
+        path = root_path / relative
+        try:
+            limits.check_size(path.stat().st_size, relative)
+            data = path.read_bytes()
+            codeq = Codeq.from_source(data.decode("utf-8"), relative, limits)
+
+        except ParseLimitError as exc:
+            if report is not None:
+                report.record(relative, ParseStatus.SKIPPED, exc.reason)
+
+            continue
+
+        except (OSError, UnicodeDecodeError) as exc:
+            if report is not None:
+                report.record(relative, ParseStatus.SKIPPED, type(exc).__name__)
+
+            continue
+
+        if report is not None:
+            report.record(relative, codeq.status)
+
+        yield FileRecord(
+            path=relative,
+            sha256=hashlib.sha256(data).hexdigest(),
+            status=codeq.status.value,
+            resources=[
+                resource_to_dict(resource, relative)
+                for resource in codeq.iter_objects()
+            ],
+        )
+
+
+def _write_header(stream: TextIO, kind: str, metadata: dict[str, Any]) -> None:
+    header = {"apiVersion": API_VERSION, "kind": kind, "metadata": metadata}
+    stream.write(json.dumps(header, separators=(",", ":")) + "\n")
+
+
+def _write_records(stream: TextIO, records: Iterable[FileRecord]) -> int:
+    count = 0
+    for record in records:
+        stream.write(
+            json.dumps(record.to_dict(), separators=(",", ":"), ensure_ascii=False)
+        )
+        stream.write("\n")
+        count += 1
+
+    return count
+
+
+def _report_to_dict(report: IndexReport) -> dict[str, Any]:
+    return {
+        "files": report.files,
+        "partial": report.partial,
+        "skipped": report.skipped,
+        "skippedPaths": dict(sorted(report.skipped_paths.items())),
+    }
+
+
+def _add_report(report: IndexReport, data: dict[str, Any]) -> None:
+    report.files += data.get("files", 0)
+    report.partial += data.get("partial", 0)
+    report.skipped += data.get("skipped", 0)
+    report.skipped_paths.update(data.get("skippedPaths", {}))
+
+
+def write_shard(
+    root: str | Path,
+    shard: int,
+    shards: int,
+    output: str | Path,
+    pattern: str = "*.py",
+    limits: ParseLimits = NO_LIMITS,
+) -> IndexReport:
+    report = IndexReport()
+    records = iter_shard_records(root, shard, shards, pattern, limits, report)
+
+    # The header carries the parse report, which is only known once every
+    # record is written, so records are spooled and copied in after it.
+    with tempfile.TemporaryFile("w+", encoding="utf-8") as body:
+        _write_records(body, records)
+        body.seek(0)
+
+        metadata = {"shard": shard, "shards": shards, "report": _report_to_dict(report)}
+        with Path(output).open("w", encoding="utf-8") as stream:
+            _write_header(stream, SHARD_KIND, metadata)
+            shutil.copyfileobj(body, stream)
+
+    return report
+
+
+def read_index(path: str | Path) -> tuple[dict[str, Any], Iterator[FileRecord]]:
+    stream = Path(path).open("r", encoding="utf-8")
+    first = stream.readline()
+
+    try:
+        header = json.loads(first)
+    except json.JSONDecodeError as exc:
+        stream.close()
+        raise IndexFormatError(f"{path}: missing index header") from exc
+
+    if not isinstance(header, dict) or not isinstance(header.get("metadata", {}), dict):
+        stream.close()
+        raise IndexFormatError(f"{path}: index header is not a JSON object")
+
+    if header.get("apiVersion") != API_VERSION:
+        stream.close()
+        raise IndexFormatError(
+            f"{path}: unsupported apiVersion {header.get('apiVersion')!r}, "
+            f"expected {API_VERSION!r}"
+        )
+
+    if header.get("kind") not in {SHARD_KIND, INDEX_KIND}:
+        stream.close()
+        raise IndexFormatError(f"{path}: unexpected kind {header.get('kind')!r}")
+
+    def records() -> Iterator[FileRecord]:
+        with stream:
+            for line_no, line in enumerate(stream, start=2):
+                if not line.strip():
+                    continue
+
+                try:
+                    yield FileRecord(**json.loads(line))
+                except (json.JSONDecodeError, TypeError) as exc:
+                    raise IndexFormatError(
+                        f"{path}:{line_no}: malformed record"
+                    ) from exc
+
+    return header, records()
+
+
+def merge_shards(
+    shard_paths: Iterable[str | Path],
+    output: str | Path,
+    root: str | Path | None = None,
+) -> MergeReport:
+    """Merge shards into one index, independent of the order shards are given.
+
+    When two shards index the same path with different content, the record
+    whose hash matches the file under ``root`` wins; without a ``root`` the
+    smallest hash is kept so every merge picks the same record.
+
+    Shards must agree on the shard total and cover every shard index, so a
+    missing shard fails the merge instead of writing a partial index.
+    """
+    report = MergeReport()
+    by_path: dict[str, dict[str, FileRecord]] = {}
+    shard_total: int | None = None
+    seen_shards: set[int] = set()
+
+    for shard_path in shard_paths:
+        header, records = read_index(shard_path)
+        report.shards += 1
+
+        for record in records:
+            variants = by_path.setdefault(record.path, {})
+            if variants:
+                report.duplicates += 1
+
+            variants.setdefault(record.sha256, record)
+
+        metadata = header.get("metadata", {})
+        if header["kind"] == SHARD_KIND:
+            if shard_total is None:
+                shard_total = metadata.get("shards")
+
+            elif metadata.get("shards") != shard_total:
+                raise IndexFormatError(
+                    f"{shard_path}: shard total {metadata.get('shards')!r} does not "
+                    f"match {shard_total!r} from earlier shards"
+                )
+
+            seen_shards.add(metadata.get("shard"))
+
+        _add_report(report.parse_report, metadata.get("report", {}))
+
+    if shard_total is not None:
+        missing = sorted(set(range(shard_total)) - seen_shards)
+        if missing:
+            raise IndexFormatError(
+                f"Missing shards {missing} of {shard_total}; refusing to write "
+                "an incomplete index"
+            )
+
+    merged: list[FileRecord] = []
+    for path in sorted(by_path):
+        variants = by_path[path]
+        chosen = variants[min(variants)]
+
+        if len(variants) > 1:
+            report.conflicts[path] = sorted(variants)
+            if root is not None:
+                current = Path(root) / path
+                if current.is_file():
+                    digest = hashlib.sha256(current.read_bytes()).hexdigest()
+                    chosen = variants.get(digest, chosen)
+
+        merged.append(chosen)
+
+    report.files = len(merged)
+
+    # A path skipped by an older shard but indexed by a newer one is not skipped.
+    for path in by_path:
+        report.parse_report.skipped_paths.pop(path, None)
+
+    metadata = {
+        "shards": report.shards,
+        "files": report.files,
+        "report": _report_to_dict(report.parse_report),
+    }
+    with Path(output).open("w", encoding="utf-8") as stream:
+        _write_header(stream, INDEX_KIND, metadata)
+        _write_records(stream, merged)
+
+    return report
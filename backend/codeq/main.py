@@ -1,12 +1,18 @@
+from bisect import bisect_right
+from collections import deque
+import copy
 from dataclasses import dataclass
+import heapq
 from pathlib import Path
 from pprint import pp
 import re
 import sys
+from string import Template
 from textwrap import dedent, indent, wrap
-from typing import TypeAlias
+from typing import Iterable, Iterator, TypeAlias
+import warnings
 
-from tree_sitter import Language, Node, Parser, Query, QueryCursor, Tree
+from tree_sitter import Language, Node, Parser, Query, QueryCursor, QueryError, Tree
 import tree_sitter_python as tspython
 
 if sys.version_info >= (3, 11):
@@ -23,6 +29,7 @@ PY_LANGUAGE = Language(tspython.language())
 parser = Parser(PY_LANGUAGE)
 
 CaptureMap: TypeAlias = dict[str, list[Node]]
+TargetIndex: TypeAlias = dict[str, list[tuple[CaptureMap, str]]]
 
 
 class CodeqError(Exception):
@@ -41,6 +48,43 @@ class AmbiguousTargetError(CodeqError):
     """Raised when a target name resolves to multiple code objects."""
 
 
+class ParseLimitError(CodeqError):
+    """Raised when a source exceeds the configured ``ParseLimits``."""
+
+    def __init__(self, message: str, reason: str) -> None:
+        super().__init__(message)
+        self.reason = reason
+
+
+class InvalidEditError(CodeqError):
+    """Raised when an edit leaves a syntax error inside the changed range."""
+
+    def __init__(self, message: str, line: int, column: int, text: str) -> None:
+        super().__init__(message)
+        self.line = line
+        self.column = column
+        self.text = text
+
+
+class RewriteTemplate(Template):
+    """Replacement template whose placeholders name query captures.
+
+    ``$name`` and ``${name}`` are substituted with the captured source text;
+    dotted capture names must use the braced form, e.g. ``${func.name}``.
+    """
+
+    idpattern = r"(?a:[_a-z][_a-z0-9]*)"
+    braceidpattern = r"(?a:[_a-z][_a-z0-9]*(?:\.[_a-z][_a-z0-9]*)*)"
+
+
+def compile_query(query: str) -> Query:
+    try:
+        return Query(PY_LANGUAGE, query)
+
+    except QueryError as exc:
+        raise ValueError(f"Invalid query: {exc}") from exc
+
+
 class CodeKind(StrEnum):
     FUNC = "func"
     CLASS = "class"
@@ -78,6 +122,51 @@ class CodePart(StrEnum):
             raise ValueError(f"Unsupported part: {value!r}") from exc
 
 
+class ParseStatus(StrEnum):
+    OK = "ok"
+    PARTIAL = "partial"
+    SKIPPED = "skipped"
+
+
+@dataclass(frozen=True)
+class ParseLimits:
+    max_bytes: int | None = None
+    timeout: float | None = None
+    max_depth: int | None = None
+
+    def check_size(self, size: int, path: str) -> None:
+        if self.max_bytes is not None and size > self.max_bytes:
+            raise ParseLimitError(
+                f"{path}: {size} bytes exceeds the {self.max_bytes} byte limit",
+                reason="size",
+            )
+
+    def parse(self, source: bytes, path: str) -> Tree:
+        self.check_size(len(source), path)
+
+        if self.timeout is None:
+            return parser.parse(source)
+
+        # progress_callback only applies to chunked reads and crashes with the
+        # pinned tree-sitter build, so use the parser-level timeout instead.
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", DeprecationWarning)
+            timed_parser = Parser(
+                PY_LANGUAGE, timeout_micros=max(1, int(self.timeout * 1_000_000))
+            )
+
+        try:
+            return timed_parser.parse(source)
+
+        except ValueError as exc:
+            raise ParseLimitError(
+                f"{path}: parsing took longer than {self.timeout}s", reason="timeout"
+            ) from exc
+
+
+NO_LIMITS = ParseLimits()
+
+
 class ResourceKind(StrEnum):
     FUNCTION = "Function"
     CLASS = "Class"
@@ -87,6 +176,35 @@ class ResourceKind(StrEnum):
 class ObjectMeta:
     name: str
     offset: int
+    line: int
+    column: int
+
+
+@dataclass(frozen=True)
+class SourceSpan:
+    start: int
+    end: int
+    start_line: int
+    start_column: int
+    end_line: int
+    end_column: int
+
+
+@dataclass(frozen=True)
+class RetrieveResult:
+    kind: str
+    target: str
+    part: str
+    text: str | None = None
+    span: SourceSpan | None = None
+    error: str | None = None
+
+
+@dataclass(frozen=True)
+class EditRecord:
+    offset: int
+    old: bytes
+    new: bytes
 
 
 @dataclass(frozen=True)
@@ -115,6 +233,8 @@ class CodeqObject:
 class FunctionMapEntry:
     start: int
     end: int
+    line: int
+    column: int
     name: str
     params: str
     return_type: str
@@ -135,7 +255,9 @@ class FunctionMapEntry:
         return CodeqObject(
             api_version="codeq/v1",
             kind=ResourceKind.FUNCTION,
-            metadata=ObjectMeta(name=self.name, offset=self.start),
+            metadata=ObjectMeta(
+                name=self.name, offset=self.start, line=self.line, column=self.column
+            ),
             spec=FunctionSpec(
                 params=self.params,
                 return_type=self.return_type,
@@ -149,6 +271,8 @@ class FunctionMapEntry:
 class ClassMapEntry:
     start: int
     end: int
+    line: int
+    column: int
     name: str
     superclasses: str
     docstring: str
@@ -164,7 +288,9 @@ class ClassMapEntry:
         return CodeqObject(
             api_version="codeq/v1",
             kind=ResourceKind.CLASS,
-            metadata=ObjectMeta(name=self.name, offset=self.start),
+            metadata=ObjectMeta(
+                name=self.name, offset=self.start, line=self.line, column=self.column
+            ),
             spec=ClassSpec(
                 superclasses=self.superclasses,
                 docstring=self.docstring,
@@ -210,25 +336,99 @@ class Codeq:
         """
     )
 
+    _definitions_query_string = "[(function_definition) (class_definition)] @definition"
+
     _file_path: str = "<FILE>"
 
-    def __init__(self, tree: Tree, source: str, path: str = "<FILE>") -> None:
+    default_journal_size = 100
+
+    def __init__(
+        self,
+        tree: Tree,
+        source: str,
+        path: str = "<FILE>",
+        limits: ParseLimits = NO_LIMITS,
+    ) -> None:
         self.tree = tree
+        self.limits = limits
         self.source_bytes = bytearray(source.encode())
         self._file_path = path
+        self._line_starts = [0] + [
+            match.end() for match in re.finditer(b"\n", self.source_bytes)
+        ]
+        self._source_shared = False
+        self._undo: deque[tuple[EditRecord, ...]] = deque(
+            maxlen=self.default_journal_size
+        )
+        self._redo: list[tuple[EditRecord, ...]] = []
 
         self._funcs_query = Query(PY_LANGUAGE, self._funcs_query_string)
         self._classes_query = Query(PY_LANGUAGE, self._classes_query_string)
+        self._depth_check: tuple[Tree, bool] | None = None
+
+    @property
+    def path(self) -> str:
+        return self._file_path
+
+    @property
+    def status(self) -> ParseStatus:
+        # Broken trees still map, but objects inside ERROR nodes may be missing.
+        if self.tree.root_node.has_error or self._depth_truncated():
+            return ParseStatus.PARTIAL
+
+        return ParseStatus.OK
+
+    def _depth_truncated(self) -> bool:
+        """Whether ``limits.max_depth`` hid any definition from the map."""
+        max_depth = self.limits.max_depth
+        if max_depth is None:
+            return False
+
+        if self._depth_check is not None and self._depth_check[0] is self.tree:
+            return self._depth_check[1]
+
+        frontier = [self.tree.root_node]
+        for _ in range(max_depth + 1):
+            frontier = [child for node in frontier for child in node.children]
+
+        # A decorated function is still mapped through its decorated_definition,
+        # so only the definitions nested inside it count as cut off.
+        to_check: list[Node] = []
+        for node in frontier:
+            if (
+                node.type == "function_definition"
+                and node.parent is not None
+                and node.parent.type == "decorated_definition"
+            ):
+                to_check.extend(node.children)
+            else:
+                to_check.append(node)
+
+        query = Query(PY_LANGUAGE, self._definitions_query_string)
+        truncated = any(QueryCursor(query).captures(node) for node in to_check)
+        self._depth_check = (self.tree, truncated)
+
+        return truncated
 
     @classmethod
-    def from_source(cls, source: str, path: str = "<FILE>") -> "Codeq":
-        tree = parser.parse(source.encode())
+    def from_source(
+        cls,
+        source: str,
+        path: str = "<FILE>",
+        limits: ParseLimits = NO_LIMITS,
+    ) -> "Codeq":
+        tree = limits.parse(source.encode(), path)
 
-        return cls(tree, source, path)
+        return cls(tree, source, path, limits)
 
     @classmethod
-    def from_file(cls, file_path: str | Path) -> "Codeq":
+    def from_file(
+        cls,
+        file_path: str | Path,
+        limits: ParseLimits = NO_LIMITS,
+    ) -> "Codeq":
         source_path = Path(file_path)
+        limits.check_size(source_path.stat().st_size, str(source_path))
         source = source_path.read_text("utf-8")
 
         try:
@@ -236,7 +436,68 @@ class Codeq:
         except ValueError:
             display_path = str(source_path)
 
-        return cls.from_source(source, display_path)
+        return cls.from_source(source, display_path, limits)
+
+    def fork(self) -> "Codeq":
+        """Return an independent copy that shares the tree and source until edited."""
+        forked = copy.copy(self)
+        forked.tree = self.tree.copy()
+        forked._undo = deque(self._undo, maxlen=self._undo.maxlen)
+        forked._redo = list(self._redo)
+
+        # Both sides copy the shared buffer and line index on their next edit.
+        self._source_shared = True
+        forked._source_shared = True
+
+        return forked
+
+    @property
+    def journal_size(self) -> int:
+        return self._undo.maxlen or 0
+
+    @journal_size.setter
+    def journal_size(self, size: int) -> None:
+        if size < 0:
+            raise ValueError("journal_size cannot be negative")
+
+        self._undo = deque(self._undo, maxlen=size)
+        self._redo = self._redo[-size:] if size else []
+
+    def undo(self) -> bool:
+        if not self._undo:
+            return False
+
+        records = self._undo.pop()
+
+        # Records hold offsets from before the edit; shift each one past the
+        # size change of the replacements ahead of it.
+        edits: list[tuple[int, int, bytes]] = []
+        shift = 0
+        for record in records:
+            start = record.offset + shift
+            edits.append((start, start + len(record.new), record.old))
+            shift += len(record.new) - len(record.old)
+
+        self._splice_many(edits, record=False)
+        self._redo.append(records)
+
+        return True
+
+    def redo(self) -> bool:
+        if not self._redo:
+            return False
+
+        records = self._redo.pop()
+        self._splice_many(
+            [
+                (record.offset, record.offset + len(record.old), record.new)
+                for record in records
+            ],
+            record=False,
+        )
+        self._undo.append(records)
+
+        return True
 
     def write_file(self, file_path: str | Path | None = None) -> Path:
         destination = self._resolve_destination(file_path)
@@ -307,30 +568,152 @@ class Codeq:
         if not re.match(r"^(import\s+|from\s+\S+\s+import\s+)", statement):
             raise ValueError(f"Unsupported import statement: {statement!r}")
 
-        source = self.source_bytes.decode()
-        lines = source.splitlines()
-
-        if statement in {line.strip() for line in lines}:
+        existing = re.compile(
+            rb"^[ \t]*" + re.escape(statement.encode()) + rb"[ \t\r]*$", re.MULTILINE
+        )
+        if existing.search(self.source_bytes):
             return False
 
-        insert_at = self._import_insert_line(lines)
-        lines.insert(insert_at, statement)
-        new_source = "\n".join(lines)
-        if source.endswith("\n"):
-            new_source += "\n"
+        insert_at = self._import_insert_line()
+        encoded = statement.encode()
+        end = len(self.source_bytes)
 
-        self.source_bytes = bytearray(new_source.encode())
-        self.tree = parser.parse(self.source_bytes)
+        if insert_at < self._line_count():
+            line_start = self._line_starts[insert_at]
+            self._splice(line_start, line_start, encoded + b"\n")
+        elif not self.source_bytes:
+            self._splice(0, 0, encoded)
+        elif self.source_bytes.endswith(b"\n"):
+            self._splice(end, end, encoded + b"\n")
+        else:
+            self._splice(end, end, b"\n" + encoded)
 
         return True
 
+    def position(self, offset: int) -> tuple[int, int]:
+        """Return the 1-based ``(line, column)`` of a byte offset."""
+        if not 0 <= offset <= len(self.source_bytes):
+            raise ValueError(f"Offset out of range: {offset}")
+
+        row, _ = self._point_at(offset)
+        line_start = self._line_starts[row]
+        column = len(self.source_bytes[line_start:offset].decode(errors="replace"))
+
+        return row + 1, column + 1
+
+    def offset_of(self, line: int, column: int = 1) -> int:
+        """Return the byte offset of a 1-based ``(line, column)`` position."""
+        if not 1 <= line <= len(self._line_starts):
+            raise ValueError(f"Line out of range: {line}")
+
+        line_start = self._line_starts[line - 1]
+        line_end = (
+            self._line_starts[line] - 1
+            if line < len(self._line_starts)
+            else len(self.source_bytes)
+        )
+        text = self.source_bytes[line_start:line_end].decode(errors="replace")
+        if not 1 <= column <= len(text) + 1:
+            raise ValueError(f"Column out of range: {column}")
+
+        return line_start + len(text[: column - 1].encode())
+
+    def retrieve_many(
+        self,
+        requests: Iterable[tuple[str | CodeKind, str, str | CodePart]],
+    ) -> list[RetrieveResult]:
+        """Resolve ``(kind, target, part)`` requests with one query pass per kind.
+
+        Results come back in request order; failures are reported per item in
+        ``RetrieveResult.error`` instead of being raised.
+        """
+        indexes: dict[CodeKind, TargetIndex] = {}
+        results: list[RetrieveResult] = []
+
+        for kind, target, what in requests:
+            try:
+                code_kind = CodeKind.parse(kind)
+                code_part = CodePart.parse(what)
+
+                if code_kind not in indexes:
+                    indexes[code_kind] = self._target_index(code_kind)
+
+                captures = self._pick_candidate(
+                    code_kind, target, indexes[code_kind].get(target, [])
+                )
+                if captures is None:
+                    raise TargetNotFoundError(
+                        f"{code_kind.value} '{target}' not found"
+                    )
+
+                bounds = self._retrieve_bounds(code_kind, code_part, captures)
+                if bounds is None:
+                    raise MissingCaptureError(
+                        f"Target found, but {code_part.value} is missing"
+                    )
+
+            except (ValueError, CodeqError) as exc:
+                results.append(
+                    RetrieveResult(
+                        kind=str(kind), target=target, part=str(what), error=str(exc)
+                    )
+                )
+                continue
+
+            start, end = bounds
+            results.append(
+                RetrieveResult(
+                    kind=code_kind.value,
+                    target=target,
+                    part=code_part.value,
+                    text=self.source_bytes[start:end].decode(),
+                    span=self._span(start, end),
+                )
+            )
+
+        return results
+
+    def coalesce(self, spans: Iterable[SourceSpan]) -> list[SourceSpan]:
+        """Merge overlapping spans and spans separated only by whitespace."""
+        merged: list[tuple[int, int]] = []
+
+        for start, end in sorted((span.start, span.end) for span in spans):
+            if merged and not self.source_bytes[merged[-1][1] : start].strip():
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+                continue
+
+            merged.append((start, end))
+
+        return [self._span(start, end) for start, end in merged]
+
+    def locate(
+        self,
+        kind: str | CodeKind,
+        target: str,
+        what: str | CodePart,
+    ) -> SourceSpan | None:
+        code_kind = CodeKind.parse(kind)
+        code_part = CodePart.parse(what)
+
+        captures = self._resolve_target_captures(code_kind, target)
+        if captures is None:
+            return None
+
+        bounds = self._retrieve_bounds(code_kind, code_part, captures)
+        if bounds is None:
+            return None
+
+        return self._span(*bounds)
+
     def objects(self) -> list[CodeqObject]:
-        resources: list[CodeqObject] = [
-            entry.to_resource() for entry in self._map_functions()
-        ]
-        resources.extend(entry.to_resource() for entry in self._map_classes())
+        return list(self.iter_objects())
+
+    def iter_objects(self) -> Iterator[CodeqObject]:
+        functions = sorted(self._map_functions(), key=lambda entry: entry.start)
+        classes = sorted(self._map_classes(), key=lambda entry: entry.start)
 
-        return sorted(resources, key=lambda resource: resource.metadata.offset)
+        for entry in heapq.merge(functions, classes, key=lambda entry: entry.start):
+            yield entry.to_resource()
 
     def _query_for(self, kind: CodeKind) -> Query:
         match kind:
@@ -342,6 +725,8 @@ class Codeq:
 
     def _matches(self, kind: CodeKind) -> list[tuple[int, CaptureMap]]:
         qcur = QueryCursor(self._query_for(kind))
+        if self.limits.max_depth is not None:
+            qcur.set_max_start_depth(self.limits.max_depth)
 
         return list(qcur.matches(self.tree.root_node))
 
@@ -362,9 +747,12 @@ class Codeq:
                     if child.type == "decorator":
                         decorators.append(child.text.decode().strip())
 
+            line, column = self.position(func_node.start_byte)
             entries_by_id[func_node.id] = FunctionMapEntry(
                 start=func_node.start_byte,
                 end=func_node.end_byte,
+                line=line,
+                column=column,
                 name=captures["func.name"][0].text.decode(),
                 params=captures["func.params"][0].text.decode(),
                 return_type=(
@@ -393,11 +781,14 @@ class Codeq:
 
         for _, captures in self._matches(CodeKind.CLASS):
             class_node = captures["class.node"][0]
+            line, column = self.position(class_node.start_byte)
 
             entries.append(
                 ClassMapEntry(
                     start=class_node.start_byte,
                     end=class_node.end_byte,
+                    line=line,
+                    column=column,
                     name=captures["class.name"][0].text.decode(),
                     superclasses=(
                         captures["class.superclasses"][0].text.decode()
@@ -427,6 +818,20 @@ class Codeq:
         if captures is None:
             return None
 
+        bounds = self._retrieve_bounds(code_kind, code_part, captures)
+        if bounds is None:
+            return None
+
+        start, end = bounds
+
+        return self.source_bytes[start:end].decode()
+
+    def _retrieve_bounds(
+        self,
+        code_kind: CodeKind,
+        code_part: CodePart,
+        captures: CaptureMap,
+    ) -> tuple[int, int] | None:
         match code_part:
             case CodePart.NODE:
                 node = captures.get(
@@ -436,7 +841,7 @@ class Codeq:
                 if not node:
                     return None
 
-                return self._decode_node(node[0])
+                return node[0].start_byte, node[0].end_byte
 
             case CodePart.LOGIC:
                 body_nodes = captures.get(f"{code_kind.value}.body")
@@ -445,11 +850,18 @@ class Codeq:
 
                 body_node = body_nodes[0]
                 start = body_node.start_byte
+                end = body_node.end_byte
                 doc_nodes = captures.get(f"{code_kind.value}.doc_node")
                 if doc_nodes:
                     start = doc_nodes[0].end_byte
 
-                return self.source_bytes[start : body_node.end_byte].decode().strip()
+                while start < end and self.source_bytes[start] in b" \t\r\n\f\v":
+                    start += 1
+
+                while end > start and self.source_bytes[end - 1] in b" \t\r\n\f\v":
+                    end -= 1
+
+                return start, end
 
             case _:
                 captured = captures.get(
@@ -459,7 +871,7 @@ class Codeq:
                 if not captured:
                     return None
 
-                return self._decode_node(captured[0])
+                return captured[0].start_byte, captured[0].end_byte
 
     def replace(
         self,
@@ -467,6 +879,7 @@ class Codeq:
         target: str,
         what: str | CodePart,
         new_text: str,
+        validate: bool = False,
     ) -> None:
         code_kind = CodeKind.parse(kind)
         code_part = CodePart.parse(what)
@@ -480,15 +893,284 @@ class Codeq:
         )
         prepared_text = indent(dedent(new_text).strip(), " " * indent_level).lstrip()
 
-        self.source_bytes[start:end] = prepared_text.encode()
-        self.tree = parser.parse(self.source_bytes)
+        self._splice(start, end, prepared_text.encode(), validate)
+
+    def rewrite(
+        self,
+        query: str | Query,
+        template: str,
+        target: str = "match",
+        validate: bool = False,
+    ) -> int:
+        compiled = compile_query(query) if isinstance(query, str) else query
+        capture_names = {
+            compiled.capture_name(idx) for idx in range(compiled.capture_count)
+        }
+        if target not in capture_names:
+            raise ValueError(
+                f"Query has no @{target} capture to replace. "
+                f"Available captures: {sorted(capture_names)}"
+            )
+
+        replacement_template = RewriteTemplate(template)
+        edits: list[tuple[int, int, bytes]] = []
+
+        for _, captures in QueryCursor(compiled).matches(self.tree.root_node):
+            target_nodes = captures.get(target)
+            if not target_nodes:
+                continue
+
+            target_node = target_nodes[0]
+            values = {
+                name: self.source_bytes[nodes[0].start_byte : nodes[0].end_byte].decode()
+                for name, nodes in captures.items()
+            }
+
+            try:
+                replacement = replacement_template.substitute(values)
+
+            except KeyError as exc:
+                raise ValueError(
+                    f"Template placeholder {exc} is not captured by the query"
+                ) from exc
+
+            replacement = indent(
+                replacement, " " * target_node.start_point[1]
+            ).lstrip(" ")
+            edits.append(
+                (target_node.start_byte, target_node.end_byte, replacement.encode())
+            )
+
+        # Keep the outermost of overlapping matches so splices never interleave.
+        edits.sort(key=lambda edit: (edit[0], -edit[1]))
+        accepted: list[tuple[int, int, bytes]] = []
+        for edit in edits:
+            if accepted and edit[0] < accepted[-1][1]:
+                continue
+
+            accepted.append(edit)
+
+        if not accepted:
+            return 0
+
+        self._splice_many(accepted, validate)
+
+        return len(accepted)
+
+    def _splice(
+        self,
+        start: int,
+        end: int,
+        new_bytes: bytes,
+        validate: bool = False,
+        record: bool = True,
+    ) -> None:
+        self._splice_many([(start, end, new_bytes)], validate, record)
+
+    def _splice_many(
+        self,
+        edits: list[tuple[int, int, bytes]],
+        validate: bool = False,
+        record: bool = True,
+    ) -> None:
+        """Replace sorted, non-overlapping byte ranges in one buffer write.
+
+        Each range gets its own tree edit, journal record and validation, so
+        untouched code between two ranges is never treated as edited.
+        """
+        if self._source_shared:
+            self.source_bytes = bytearray(self.source_bytes)
+            self._line_starts = list(self._line_starts)
+            self._source_shared = False
+
+        old_tree = self.tree
+        first = edits[0][0]
+        last = edits[-1][1]
+        old_span = bytes(self.source_bytes[first:last])
+
+        chunks: list[bytes] = []
+        cursor = first
+        for start, end, new_bytes in edits:
+            chunks.append(old_span[cursor - first : start - first])
+            chunks.append(new_bytes)
+            cursor = end
+
+        records: list[EditRecord] = []
+        new_ranges: list[tuple[int, int]] = []
+        edited = old_tree.copy()
+        shift = 0
+        for start, end, new_bytes in edits:
+            new_start = start + shift
+            old_end = end + shift
+            new_end = new_start + len(new_bytes)
+
+            start_point = self._point_at(new_start)
+            old_end_point = self._point_at(old_end)
+            self._update_line_starts(new_start, old_end, new_bytes)
+            edited.edit(
+                start_byte=new_start,
+                old_end_byte=old_end,
+                new_end_byte=new_end,
+                start_point=start_point,
+                old_end_point=old_end_point,
+                new_end_point=self._point_at(new_end),
+            )
+
+            records.append(
+                EditRecord(
+                    offset=start,
+                    old=old_span[start - first : end - first],
+                    new=bytes(new_bytes),
+                )
+            )
+            new_ranges.append((new_start, new_end))
+            shift += len(new_bytes) - (end - start)
+
+        self.source_bytes[first:last] = b"".join(chunks)
+        self.tree = parser.parse(self.source_bytes, edited)
+
+        error_node = None
+        if validate:
+            for new_start, new_end in new_ranges:
+                error_node = self._deepest_error_in(new_start, new_end)
+                if error_node is not None:
+                    break
+
+        if error_node is None:
+            if record and self._undo.maxlen:
+                self._undo.append(tuple(records))
+                self._redo.clear()
+
+            return
+
+        line, column = self.position(self._error_offset(error_node, new_start, new_end))
+        line_text = self._line_text(line - 1)
+        problem = (
+            f"missing {error_node.type!r}" if error_node.is_missing else "syntax error"
+        )
+
+        self.source_bytes[first : last + shift] = old_span
+        for (new_start, new_end), edit_record in zip(
+            reversed(new_ranges), reversed(records)
+        ):
+            self._update_line_starts(new_start, new_end, edit_record.old)
+        self.tree = old_tree
+
+        raise InvalidEditError(
+            f"{self._file_path}:{line}:{column}: {problem} in edited code: "
+            f"{line_text.strip()!r}",
+            line=line,
+            column=column,
+            text=line_text,
+        )
+
+    def _deepest_error_in(self, start: int, end: int) -> Node | None:
+        node = self.tree.root_node
+        deepest: Node | None = node if node.is_error else None
+
+        while node.has_error:
+            next_node = None
+            for child in node.children:
+                if child.end_byte < start or child.start_byte > end:
+                    continue
+
+                if child.is_error or child.is_missing or child.has_error:
+                    next_node = child
+                    break
+
+            if next_node is None:
+                break
+
+            if next_node.is_error or next_node.is_missing:
+                deepest = next_node
+
+            node = next_node
+
+        return deepest
+
+    def _error_offset(self, error_node: Node, start: int, end: int) -> int:
+        if error_node.start_byte >= start:
+            return error_node.start_byte
+
+        # An ERROR node can swallow valid code before the edit, such as the
+        # enclosing function header; point at the first piece of the edit that
+        # is not a complete statement instead.
+        for child in error_node.children:
+            if child.end_byte <= start:
+                continue
+
+            if child.start_byte > end:
+                break
+
+            complete = child.type.endswith(("_statement", "_definition"))
+            if (complete and not child.has_error) or child.type == ";":
+                continue
+
+            return max(child.start_byte, start)
+
+        return start
+
+    def _point_at(self, offset: int) -> tuple[int, int]:
+        row = bisect_right(self._line_starts, offset) - 1
+
+        return row, offset - self._line_starts[row]
+
+    def _span(self, start: int, end: int) -> SourceSpan:
+        start_line, start_column = self.position(start)
+        end_line, end_column = self.position(end)
+
+        return SourceSpan(
+            start=start,
+            end=end,
+            start_line=start_line,
+            start_column=start_column,
+            end_line=end_line,
+            end_column=end_column,
+        )
+
+    def _update_line_starts(self, start: int, end: int, new_bytes: bytes) -> None:
+        starts = self._line_starts
+        delta = len(new_bytes) - (end - start)
+
+        # Line starts inside (start, end] belonged to newlines that were replaced.
+        lo = bisect_right(starts, start)
+        hi = bisect_right(starts, end)
+        inserted = [
+            start + match.end() for match in re.finditer(b"\n", new_bytes)
+        ]
+        starts[lo:hi] = inserted
+
+        if delta:
+            for idx in range(lo + len(inserted), len(starts)):
+                starts[idx] += delta
+
+    def _line_count(self) -> int:
+        if not self.source_bytes or self.source_bytes.endswith(b"\n"):
+            return len(self._line_starts) - 1
+
+        return len(self._line_starts)
+
+    def _line_text(self, row: int) -> str:
+        line_start = self._line_starts[row]
+        line_end = (
+            self._line_starts[row + 1] - 1
+            if row + 1 < len(self._line_starts)
+            else len(self.source_bytes)
+        )
+
+        return self.source_bytes[line_start:line_end].decode(errors="replace")
 
     def _resolve_target_captures(
         self,
         code_kind: CodeKind,
         target: str,
     ) -> CaptureMap | None:
-        candidates: list[tuple[CaptureMap, str]] = []
+        return self._pick_candidate(
+            code_kind, target, self._target_index(code_kind).get(target, [])
+        )
+
+    def _target_index(self, code_kind: CodeKind) -> TargetIndex:
+        index: TargetIndex = {}
 
         for _, captures in self._matches(code_kind):
             name_node = captures[f"{code_kind.value}.name"][0]
@@ -499,14 +1181,22 @@ class Codeq:
                 class_name = self._enclosing_class_name(func_node)
                 fqn = f"{class_name}.{obj_name}" if class_name else obj_name
 
-                if target == fqn or ("." not in target and target == obj_name):
-                    candidates.append((captures, fqn))
+                index.setdefault(fqn, []).append((captures, fqn))
+                if fqn != obj_name:
+                    index.setdefault(obj_name, []).append((captures, fqn))
 
                 continue
 
-            if target == obj_name:
-                candidates.append((captures, obj_name))
+            index.setdefault(obj_name, []).append((captures, obj_name))
 
+        return index
+
+    def _pick_candidate(
+        self,
+        code_kind: CodeKind,
+        target: str,
+        candidates: list[tuple[CaptureMap, str]],
+    ) -> CaptureMap | None:
         if not candidates:
             return None
 
@@ -570,9 +1260,6 @@ class Codeq:
                     target_node.start_point[1],
                 )
 
-    def _decode_node(self, node: Node) -> str:
-        return self.source_bytes[node.start_byte : node.end_byte].decode()
-
     def _enclosing_class_name(self, node: Node) -> str | None:
         current = node.parent
         while current is not None:
@@ -588,17 +1275,18 @@ class Codeq:
 
         return None
 
-    def _import_insert_line(self, lines: list[str]) -> int:
+    def _import_insert_line(self) -> int:
+        line_count = self._line_count()
         start = 0
-        if lines and lines[0].startswith("#!"):
+        if line_count and self._line_text(0).startswith("#!"):
             start = 1
 
-        if len(lines) > start and re.match(r"^#\s*-\*-\s*coding:", lines[start]):
+        if line_count > start and re.match(
+            r"^#\s*-\*-\s*coding:", self._line_text(start)
+        ):
             start += 1
 
-        source = "\n".join(lines)
-        tree = parser.parse(source.encode())
-        root = tree.root_node
+        root = self.tree.root_node
         children = [
             child for child in root.children if child.type not in {"comment", "\n"}
         ]
@@ -0,0 +1,140 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import difflib
+from functools import lru_cache
+from pathlib import Path
+
+from tree_sitter import Query
+
+from .main import (
+    NO_LIMITS,
+    Codeq,
+    CodeqError,
+    ParseLimitError,
+    ParseLimits,
+    compile_query,
+)
+
+
+@dataclass(frozen=True)
+class FileRewrite:
+    path: str
+    matches: int
+    diff: str
+    error: str | None = None
+    skipped: bool = False
+
+
+@dataclass(frozen=True)
+class RewriteReport:
+    files: list[FileRewrite]
+    dry_run: bool
+
+    @property
+    def matches(self) -> int:
+        return sum(item.matches for item in self.files)
+
+    @property
+    def changed_files(self) -> int:
+        return sum(1 for item in self.files if item.matches)
+
+    @property
+    def skipped(self) -> int:
+        return sum(1 for item in self.files if item.skipped)
+
+    @property
+    def errors(self) -> list[FileRewrite]:
+        return [item for item in self.files if item.error is not None]
+
+
+@lru_cache(maxsize=8)
+def _cached_query(query: str) -> Query:
+    # Query objects can't be pickled, so each worker process compiles its own.
+    return compile_query(query)
+
+
+def rewrite_file(
+    file_path: str | Path,
+    query: str,
+    template: str,
+    target: str = "match",
+    dry_run: bool = False,
+    validate: bool = True,
+    limits: ParseLimits = NO_LIMITS,
+) -> FileRewrite:
+    path = Path(file_path)
+
+    try:
+        limits.check_size(path.stat().st_size, str(path))
+        original = path.read_text("utf-8")
+        codeq = Codeq.from_source(original, str(path), limits)
+        matches = codeq.rewrite(_cached_query(query), template, target, validate)
+
+    except ParseLimitError as exc:
+        return FileRewrite(
+            path=str(path), matches=0, diff="", error=str(exc), skipped=True
+        )
+
+    except (OSError, ValueError, CodeqError) as exc:
+        return FileRewrite(path=str(path), matches=0, diff="", error=str(exc))
+
+    if not matches:
+        return FileRewrite(path=str(path), matches=0, diff="")
+
+    updated = codeq.source_bytes.decode()
+    diff = "".join(
+        difflib.unified_diff(
+            original.splitlines(keepends=True),
+            updated.splitlines(keepends=True),
+            fromfile=f"a/{path}",
+            tofile=f"b/{path}",
+        )
+    )
+
+    if not dry_run:
+        codeq.overwrite_file(path)
+
+    return FileRewrite(path=str(path), matches=matches, diff=diff)
+
+
+def rewrite_paths(
+    root: str | Path,
+    query: str,
+    template: str,
+    target: str = "match",
+    pattern: str = "*.py",
+    dry_run: bool = False,
+    validate: bool = True,
+    workers: int | None = None,
+    limits: ParseLimits = NO_LIMITS,
+) -> RewriteReport:
+    # Fail fast on a bad query instead of reporting it once per file.
+    compile_query(query)
+
+    root_path = Path(root)
+    paths = [root_path] if root_path.is_file() else sorted(root_path.rglob(pattern))
+    paths = [path for path in paths if path.is_file()]
+
+    if workers == 1 or len(paths) < 2:
+        files = [
+            rewrite_file(path, query, template, target, dry_run, validate, limits)
+            for path in paths
+        ]
+        return RewriteReport(files=files, dry_run=dry_run)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        files = list(
+            executor.map(
+                rewrite_file,
+                paths,
+                [query] * len(paths),
+                [template] * len(paths),
+                [target] * len(paths),
+                [dry_run] * len(paths),
+                [validate] * len(paths),
+                [limits] * len(paths),
+                chunksize=max(1, len(paths) // (8 * (workers or 4))),
+            )
+        )
+
+    return RewriteReport(files=files, dry_run=dry_run)
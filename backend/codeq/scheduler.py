@@ -0,0 +1,225 @@
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable, TypeAlias
+
+from .main import Codeq, CodeqError
+
+
+CodemodJob: TypeAlias = Callable[[Codeq], Any]
+
+
+class QueueFullError(CodeqError):
+    """Raised when the scheduler queue is full and the caller won't wait."""
+
+
+class SchedulerClosedError(CodeqError):
+    """Raised when a job is submitted to a scheduler that was shut down."""
+
+
+@dataclass(frozen=True)
+class SchedulerStats:
+    queued: int
+    running: int
+    completed: int
+    failed: int
+    cancelled: int
+    max_queue: int
+    avg_wait: float
+    max_wait: float
+
+
+@dataclass
+class _Job:
+    path: Path
+    func: CodemodJob
+    write: bool
+    future: Future
+    submitted_at: float = field(default_factory=time.monotonic)
+
+
+class CodemodScheduler:
+    """Run codemod jobs on a worker pool, one job at a time per file.
+
+    Each job gets a freshly loaded ``Codeq`` for its file and the result is
+    written back before the next job for the same file starts, so concurrent
+    sessions editing one file no longer overwrite each other's changes.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 64) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+
+        if max_queue < 1:
+            raise ValueError("max_queue must be at least 1")
+
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+
+        self._cond = threading.Condition()
+        self._ready: deque[_Job] = deque()
+        self._pending_by_file: dict[Path, deque[_Job]] = {}
+        self._active_files: set[Path] = set()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        self._started = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._closed = False
+
+        self._workers = [
+            threading.Thread(
+                target=self._worker_loop, name=f"codemod-worker-{idx}", daemon=True
+            )
+            for idx in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def __enter__(self) -> "CodemodScheduler":
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self.shutdown()
+
+    def submit(
+        self,
+        file_path: str | Path,
+        job: CodemodJob,
+        *,
+        write: bool = True,
+        block: bool = True,
+        timeout: float | None = None,
+    ) -> Future:
+        key = Path(file_path).resolve()
+        future: Future = Future()
+
+        with self._cond:
+            if self._closed:
+                raise SchedulerClosedError("Scheduler is shut down")
+
+            if self._queued >= self.max_queue:
+                if not block:
+                    raise QueueFullError(
+                        f"Codemod queue is full ({self.max_queue} jobs waiting)"
+                    )
+
+                has_room = self._cond.wait_for(
+                    lambda: self._closed or self._queued < self.max_queue, timeout
+                )
+                if self._closed:
+                    raise SchedulerClosedError("Scheduler is shut down")
+
+                if not has_room:
+                    raise QueueFullError(
+                        f"Codemod queue is still full after waiting {timeout}s"
+                    )
+
+            queued_job = _Job(path=key, func=job, write=write, future=future)
+            self._queued += 1
+
+            if key in self._active_files:
+                self._pending_by_file.setdefault(key, deque()).append(queued_job)
+            else:
+                self._active_files.add(key)
+                self._ready.append(queued_job)
+
+            self._cond.notify_all()
+
+        return future
+
+    def stats(self) -> SchedulerStats:
+        with self._cond:
+            return SchedulerStats(
+                queued=self._queued,
+                running=self._running,
+                completed=self._completed,
+                failed=self._failed,
+                cancelled=self._cancelled,
+                max_queue=self.max_queue,
+                avg_wait=self._total_wait / self._started if self._started else 0.0,
+                max_wait=self._max_wait,
+            )
+
+    def join(self, timeout: float | None = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self._queued == 0 and self._running == 0, timeout
+            )
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._cond:
+            if wait:
+                self._cond.wait_for(lambda: self._queued == 0 and self._running == 0)
+
+            self._closed = True
+            self._cond.notify_all()
+
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    def _worker_loop(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or bool(self._ready))
+                if not self._ready:
+                    return
+
+                job = self._ready.popleft()
+                self._queued -= 1
+
+                if not job.future.set_running_or_notify_cancel():
+                    self._cancelled += 1
+                    self._release_file(job.path)
+                    continue
+
+                wait = time.monotonic() - job.submitted_at
+                self._running += 1
+                self._started += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+                self._cond.notify_all()
+
+            succeeded = self._run(job)
+
+            with self._cond:
+                self._running -= 1
+                if succeeded:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+
+                self._release_file(job.path)
+
+    def _release_file(self, path: Path) -> None:
+        pending = self._pending_by_file.get(path)
+        if pending:
+            self._ready.append(pending.popleft())
+            if not pending:
+                del self._pending_by_file[path]
+        else:
+            self._active_files.discard(path)
+
+        self._cond.notify_all()
+
+    def _run(self, job: _Job) -> bool:
+        try:
+            codeq = Codeq.from_file(job.path)
+            result = job.func(codeq)
+            if job.write:
+                codeq.overwrite_file(job.path)
+
+        except BaseException as exc:
+            job.future.set_exception(exc)
+            return False
+
+        job.future.set_result(result)
+
+        return True
@@ -0,0 +1,261 @@
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+from pathlib import Path
+import sqlite3
+import threading
+from typing import Any, Callable
+
+CACHE_DIR_ENV = "CODECTL_LLM_CACHE"
+CACHE_MAX_BYTES_ENV = "CODECTL_LLM_CACHE_MAX_BYTES"
+
+# Parameters that never change what the model returns. Everything else is
+# part of the cache key, so an unknown parameter can only cause a miss.
+_NON_KEY_PARAMS = frozenset(
+    {
+        "api_key",
+        "timeout",
+        "request_timeout",
+        "num_retries",
+        "max_retries",
+        "metadata",
+        "user",
+        "stream",
+        "stream_options",
+        "callbacks",
+        "success_callback",
+        "failure_callback",
+        "logger_fn",
+    }
+)
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    bypassed: int
+    evictions: int
+    entries: int
+    size_bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+
+        return self.hits / lookups if lookups else 0.0
+
+
+def _normalize_messages(value: Any) -> Any:
+    # Only line endings and trailing whitespace are dropped; leading
+    # whitespace is indentation and changes what the model sees.
+    if isinstance(value, str):
+        lines = value.replace("\r\n", "\n").split("\n")
+
+        return "\n".join(line.rstrip() for line in lines)
+
+    if isinstance(value, dict):
+        return {str(key): _normalize_messages(item) for key, item in value.items()}
+
+    if isinstance(value, (list, tuple)):
+        return [_normalize_messages(item) for item in value]
+
+    return value
+
+
+def _to_jsonable(response: Any) -> Any:
+    for method in ("model_dump", "to_dict", "dict"):
+        dump = getattr(response, method, None)
+        if callable(dump):
+            return dump()
+
+    return response
+
+
+def _from_jsonable(data: Any) -> Any:
+    try:
+        from litellm import ModelResponse
+
+    except ImportError:
+        return data
+
+    if isinstance(data, dict) and data.get("object") == "chat.completion":
+        return ModelResponse(**data)
+
+    return data
+
+
+class CompletionCache:
+    """On-disk LRU cache for deterministic LLM completion calls.
+
+    Only calls with ``temperature == 0`` or an explicit ``seed`` are cached;
+    other calls always go to the model. This is a library helper: nothing in
+    codectl installs it, so callers opt in by wrapping their own completion
+    function with ``wrap()``. ``from_env()`` builds a cache from
+    ``CODECTL_LLM_CACHE`` and returns ``None`` when it is unset.
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int = 256 * 1024 * 1024) -> None:
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be positive")
+
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self.directory / "completions.sqlite3", check_same_thread=False
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " accessed INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)"
+        )
+        self._db.commit()
+
+        # Logical access clock for LRU order; wall time can tie on fast hits.
+        (self._clock,) = self._db.execute(
+            "SELECT COALESCE(MAX(accessed), 0) FROM completions"
+        ).fetchone()
+        self._hits = 0
+        self._misses = 0
+        self._bypassed = 0
+        self._evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "CompletionCache | None":
+        directory = os.environ.get(CACHE_DIR_ENV)
+        if not directory:
+            return None
+
+        max_bytes = os.environ.get(CACHE_MAX_BYTES_ENV)
+        if max_bytes:
+            return cls(directory, max_bytes=int(max_bytes))
+
+        return cls(directory)
+
+    @staticmethod
+    def is_deterministic(params: dict[str, Any]) -> bool:
+        return params.get("temperature") == 0 or params.get("seed") is not None
+
+    @staticmethod
+    def key(model: str, messages: list[dict[str, Any]], **params: Any) -> str:
+        payload = {
+            "model": model,
+            "messages": _normalize_messages(messages),
+            "params": {
+                name: value
+                for name, value in params.items()
+                if name not in _NON_KEY_PARAMS
+            },
+        }
+        encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self._misses += 1
+                return None
+
+            self._db.execute(
+                "UPDATE completions SET accessed = ? WHERE key = ?", (self._tick(), key)
+            )
+            self._db.commit()
+            self._hits += 1
+
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Any) -> None:
+        encoded = json.dumps(value, default=str)
+        size = len(encoded.encode())
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO completions (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, encoded, size, self._tick()),
+            )
+            self._evict()
+            self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM completions")
+            self._db.commit()
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            entries, size_bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions"
+            ).fetchone()
+
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                bypassed=self._bypassed,
+                evictions=self._evictions,
+                entries=entries,
+                size_bytes=size_bytes,
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def wrap(self, completion: Callable[..., Any]) -> Callable[..., Any]:
+        """Wrap a ``litellm.completion``-style callable with this cache."""
+
+        def cached_completion(
+            model: str, messages: list[dict[str, Any]], **params: Any
+        ) -> Any:
+            if params.get("stream") or not self.is_deterministic(params):
+                with self._lock:
+                    self._bypassed += 1
+
+                return completion(model=model, messages=messages, **params)
+
+            key = self.key(model, messages, **params)
+            cached = self.get(key)
+            if cached is not None:
+                return _from_jsonable(cached)
+
+            response = completion(model=model, messages=messages, **params)
+            self.put(key, _to_jsonable(response))
+
+            return response
+
+        return cached_completion
+
+    def _tick(self) -> int:
+        self._clock += 1
+
+        return self._clock
+
+    def _evict(self) -> None:
+        (total,) = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM completions"
+        ).fetchone()
+
+        while total > self.max_bytes:
+            row = self._db.execute(
+                "SELECT key, size FROM completions ORDER BY accessed LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return
+
+            self._db.execute("DELETE FROM completions WHERE key = ?", (row[0],))
+            total -= row[1]
+            self._evictions += 1
@@ -1,8 +1,19 @@
+import json
 from pathlib import Path
+import sys
 
 import typer
 
 from agent import CodeEditAgent
+from codeq.export import (
+    IndexReport,
+    iter_project_resources,
+    write_binary,
+    write_ndjson,
+)
+from codeq.index import IndexFormatError, merge_shards, write_shard
+from codeq.main import Codeq, ParseLimits
+from codeq.rewrite import rewrite_paths
 
 app = typer.Typer(help="Code editing CLI.")
 
@@ -24,5 +35,155 @@ def patch_logic(
     typer.echo(updated)
 
 
+@app.command("rewrite")
+def rewrite(
+    root: Path = typer.Argument(..., help="File or directory to rewrite."),
+    query: str = typer.Argument(..., help="Tree-sitter query to match."),
+    template: str = typer.Argument(..., help="Replacement with $capture placeholders."),
+    target: str = typer.Option("match", help="Capture whose node is replaced."),
+    pattern: str = typer.Option("*.py", help="Glob for files under a directory."),
+    dry_run: bool = typer.Option(
+        False, "--dry-run", help="Report matches and diff without writing."
+    ),
+    workers: int = typer.Option(0, help="Worker processes (0 = one per CPU)."),
+) -> None:
+    """Rewrite every query match under ROOT with TEMPLATE."""
+    try:
+        report = rewrite_paths(
+            root,
+            query,
+            template,
+            target=target,
+            pattern=pattern,
+            dry_run=dry_run,
+            workers=workers or None,
+        )
+
+    except ValueError as exc:
+        typer.echo(str(exc), err=True)
+        raise typer.Exit(code=2) from exc
+
+    for item in report.files:
+        if item.diff and dry_run:
+            typer.echo(item.diff, nl=False)
+
+        if item.error is not None:
+            typer.echo(f"{item.path}: {item.error}", err=True)
+
+    action = "would change" if dry_run else "changed"
+    typer.echo(f"{report.matches} matches, {action} {report.changed_files} files")
+
+    if report.errors:
+        raise typer.Exit(code=1)
+
+
+@app.command("export")
+def export(
+    root: Path = typer.Argument(..., help="File or directory to export."),
+    output: Path = typer.Option(None, help="Write to a file instead of stdout."),
+    binary: bool = typer.Option(
+        False, "--binary", help="Use the compact binary format (requires --output)."
+    ),
+    pattern: str = typer.Option("*.py", help="Glob for files under a directory."),
+    max_bytes: int = typer.Option(None, help="Skip files larger than this."),
+    timeout: float = typer.Option(None, help="Skip files slower to parse (seconds)."),
+    max_depth: int = typer.Option(None, help="Ignore definitions nested deeper."),
+) -> None:
+    """Stream codeq/v1 resources as NDJSON, one object per line."""
+    limits = ParseLimits(max_bytes=max_bytes, timeout=timeout, max_depth=max_depth)
+    report = IndexReport()
+    resources = iter_project_resources(root, pattern, limits, report)
+
+    if binary:
+        if output is None:
+            typer.echo("--binary requires --output", err=True)
+            raise typer.Exit(code=2)
+
+        with output.open("wb") as stream:
+            write_binary(resources, stream)
+
+    elif output is None:
+        write_ndjson(resources, sys.stdout)
+
+    else:
+        with output.open("w", encoding="utf-8") as stream:
+            write_ndjson(resources, stream)
+
+    typer.echo(report.summary(), err=True)
+    for path, reason in report.skipped_paths.items():
+        typer.echo(f"skipped {path}: {reason}", err=True)
+
+
+@app.command("retrieve-many")
+def retrieve_many(
+    target_file: Path = typer.Argument(..., help="Python file to read from."),
+) -> None:
+    """Read 'KIND TARGET PART' lines from stdin and print one JSON result per line."""
+    requests: list[tuple[str, str, str]] = []
+    stdin_lines = typer.get_text_stream("stdin").read().splitlines()
+    for line_no, line in enumerate(stdin_lines, start=1):
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+
+        if len(fields) != 3:
+            typer.echo(f"stdin:{line_no}: expected 'KIND TARGET PART'", err=True)
+            raise typer.Exit(code=2)
+
+        requests.append((fields[0], fields[1], fields[2]))
+
+    codeq = Codeq.from_file(target_file)
+    for result in codeq.retrieve_many(requests):
+        typer.echo(
+            json.dumps(
+                {
+                    "kind": result.kind,
+                    "target": result.target,
+                    "part": result.part,
+                    "text": result.text,
+                    "line": result.span.start_line if result.span else None,
+                    "error": result.error,
+                }
+            )
+        )
+
+
+@app.command("index-shard")
+def index_shard(
+    root: Path = typer.Argument(..., help="Repository root to index."),
+    output: Path = typer.Argument(..., help="Shard file to write."),
+    shard: int = typer.Option(0, help="Index of this shard."),
+    shards: int = typer.Option(1, help="Total number of shards."),
+    pattern: str = typer.Option("*.py", help="Glob for files under ROOT."),
+    max_bytes: int = typer.Option(None, help="Skip files larger than this."),
+    timeout: float = typer.Option(None, help="Skip files slower to parse (seconds)."),
+) -> None:
+    """Index the directories assigned to one shard."""
+    limits = ParseLimits(max_bytes=max_bytes, timeout=timeout)
+    report = write_shard(root, shard, shards, output, pattern, limits)
+    typer.echo(report.summary(), err=True)
+
+
+@app.command("index-merge")
+def index_merge(
+    output: Path = typer.Argument(..., help="Merged index file to write."),
+    shard_files: list[Path] = typer.Argument(..., help="Shard files to merge."),
+    root: Path = typer.Option(None, help="Checkout used to resolve conflicts."),
+) -> None:
+    """Merge index shards into a single index."""
+    try:
+        report = merge_shards(shard_files, output, root)
+
+    except IndexFormatError as exc:
+        typer.echo(str(exc), err=True)
+        raise typer.Exit(code=1) from exc
+
+    typer.echo(
+        f"{report.files} files from {report.shards} shards, "
+        f"{report.duplicates} duplicates, {len(report.conflicts)} conflicts"
+    )
+    typer.echo(report.parse_report.summary(), err=True)
+
+
 if __name__ == "__main__":
     app()
@@ -1,6 +1,9 @@
+import os
 from pathlib import Path
 
-from agent import CodeEditAgent
+import pytest
+
+from agent import CodeEditAgent, CodeqSession, ExternalModificationError
 
 
 def test_code_edit_agent_apply_logic_patch(tmp_path: Path) -> None:
@@ -15,3 +18,66 @@ def test_code_edit_agent_apply_logic_patch(tmp_path: Path) -> None:
 
     assert "print('updated')" in updated
     assert target.read_text("utf-8") == "def main():\n    print('updated')\n"
+
+
+def test_session_parses_once_across_tool_calls_and_flushes_once(tmp_path: Path) -> None:
+    target = tmp_path / "sample.py"
+    target.write_text("def main():\n    return 1\n", "utf-8")
+
+    session = CodeqSession()
+    agent = CodeEditAgent(target_file=target, session=session)
+
+    for step in range(30):
+        agent.file_map()
+        agent.replace("func", "main", "logic", f"return {step}")
+        assert agent.retrieve("func", "main", "logic") == f"return {step}"
+
+    assert session.loads == 1
+    assert target.read_text("utf-8") == "def main():\n    return 1\n"
+
+    assert session.flush() == [target.resolve()]
+    assert target.read_text("utf-8") == "def main():\n    return 29\n"
+    assert session.flush() == []
+
+
+def test_session_reloads_clean_file_after_external_change(tmp_path: Path) -> None:
+    target = tmp_path / "sample.py"
+    target.write_text("def main():\n    return 1\n", "utf-8")
+
+    session = CodeqSession()
+    agent = CodeEditAgent(target_file=target, session=session)
+    assert agent.retrieve("func", "main", "logic") == "return 1"
+
+    target.write_text("def main():\n    return 'external'\n", "utf-8")
+
+    assert agent.retrieve("func", "main", "logic") == "return 'external'"
+    assert session.loads == 2
+
+
+def test_session_ignores_touch_without_content_change(tmp_path: Path) -> None:
+    target = tmp_path / "sample.py"
+    target.write_text("def main():\n    return 1\n", "utf-8")
+
+    session = CodeqSession()
+    session.open(target)
+    stat = target.stat()
+    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    session.open(target)
+
+    assert session.loads == 1
+    assert session.hits == 1
+
+
+def test_session_refuses_to_clobber_external_change_to_dirty_file(tmp_path: Path) -> None:
+    target = tmp_path / "sample.py"
+    target.write_text("def main():\n    return 1\n", "utf-8")
+
+    agent = CodeEditAgent(target_file=target)
+    agent.replace("func", "main", "logic", "return 2")
+
+    target.write_text("def main():\n    return 'external'\n", "utf-8")
+
+    with pytest.raises(ExternalModificationError, match="modified outside the session"):
+        agent.flush()
+
+    assert target.read_text("utf-8") == "def main():\n    return 'external'\n"
@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 
 from typer.testing import CliRunner
@@ -25,3 +26,54 @@ def test_patch_logic_command_updates_target_file(tmp_path: Path) -> None:
     assert result.exit_code == 0
     assert "print('updated from cli')" in result.stdout
     assert target.read_text("utf-8") == "def main():\n    print('updated from cli')\n"
+
+
+def test_rewrite_command_dry_run_reports_matches(tmp_path: Path) -> None:
+    target = tmp_path / "sample.py"
+    target.write_text("def main():\n    print('hello')\n", "utf-8")
+
+    result = runner.invoke(
+        app,
+        [
+            "rewrite",
+            str(tmp_path),
+            "(call function: (identifier) @fn (#eq? @fn \"print\") arguments: (_) @args) @match",
+            "log$args",
+            "--dry-run",
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert "+    log('hello')" in result.stdout
+    assert "1 matches, would change 1 files" in result.stdout
+    assert target.read_text("utf-8") == "def main():\n    print('hello')\n"
+
+
+def test_export_command_writes_ndjson(tmp_path: Path) -> None:
+    target = tmp_path / "sample.py"
+    target.write_text("def main():\n    pass\n\nclass Worker:\n    pass\n", "utf-8")
+
+    result = runner.invoke(app, ["export", str(target)])
+
+    assert result.exit_code == 0
+    assert [json.loads(line)["kind"] for line in result.stdout.splitlines()] == [
+        "Function",
+        "Class",
+    ]
+
+
+def test_retrieve_many_command_reads_requests_from_stdin(tmp_path: Path) -> None:
+    target = tmp_path / "sample.py"
+    target.write_text("def main():\n    print('hello')\n", "utf-8")
+
+    result = runner.invoke(
+        app,
+        ["retrieve-many", str(target)],
+        input="func main logic\n# comment\n\nfunc missing node\n",
+    )
+
+    assert result.exit_code == 0
+    lines = [json.loads(line) for line in result.stdout.splitlines()]
+    assert [line["text"] for line in lines] == ["print('hello')", None]
+    assert lines[0]["line"] == 2
+    assert lines[1]["error"] == "func 'missing' not found"
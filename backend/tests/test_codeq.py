@@ -2,7 +2,17 @@ from textwrap import dedent
 
 import pytest
 
-from codeq.main import AmbiguousTargetError, CodeKind, CodePart, Codeq
+from codeq.main import (
+    AmbiguousTargetError,
+    CodeKind,
+    CodePart,
+    Codeq,
+    InvalidEditError,
+    ParseLimitError,
+    ParseLimits,
+    ParseStatus,
+    SourceSpan,
+)
 
 
 def test_file_map_groups_methods_under_class_with_separators() -> None:
@@ -139,3 +149,400 @@ def test_replace_supports_fully_qualified_method_name() -> None:
     updated = codeq.retrieve(CodeKind.FUNC, "Worker.run", CodePart.LOGIC)
 
     assert updated == 'return "updated"'
+
+
+def test_replace_with_validate_rolls_back_invalid_logic() -> None:
+    source = dedent(
+        """
+        def run():
+            return 1
+
+        def other():
+            return 2
+        """
+    )
+
+    codeq = Codeq.from_source(source, "module.py")
+
+    with pytest.raises(InvalidEditError, match=r"module.py:3:\d+: .* in edited code") as exc:
+        codeq.replace(CodeKind.FUNC, "run", CodePart.LOGIC, "return (1 +", validate=True)
+
+    assert exc.value.line == 3
+    assert "return (1 +" in exc.value.text
+    assert codeq.source_bytes.decode() == source
+    assert codeq.retrieve(CodeKind.FUNC, "run", CodePart.LOGIC) == "return 1"
+
+
+def test_replace_with_validate_ignores_errors_outside_changed_range() -> None:
+    source = dedent(
+        """
+        def run():
+            return 1
+
+        def broken(:
+            pass
+        """
+    )
+
+    codeq = Codeq.from_source(source)
+    codeq.replace(CodeKind.FUNC, "run", CodePart.LOGIC, "return 2", validate=True)
+
+    assert codeq.retrieve(CodeKind.FUNC, "run", CodePart.LOGIC) == "return 2"
+
+
+def test_replace_keeps_tree_in_sync_after_incremental_reparse() -> None:
+    codeq = Codeq.from_source("def run():\n    return 1\n\ndef other():\n    return 2\n")
+
+    codeq.replace(CodeKind.FUNC, "run", CodePart.LOGIC, "x = 1\nreturn x")
+
+    assert codeq.tree.root_node.end_byte == len(codeq.source_bytes)
+    assert codeq.retrieve(CodeKind.FUNC, "other", CodePart.NODE) == "def other():\n    return 2"
+
+
+def test_objects_and_locate_report_line_and_column() -> None:
+    source = dedent(
+        """
+        x = "é"
+
+        class Worker:
+            def run(self):
+                return 1
+        """
+    )
+
+    codeq = Codeq.from_source(source)
+
+    locations = [
+        (obj.metadata.name, obj.metadata.line, obj.metadata.column)
+        for obj in codeq.objects()
+    ]
+
+    assert locations == [
+        ("Worker", 4, 1),
+        ("run", 5, 5),
+    ]
+    assert codeq.locate(CodeKind.FUNC, "run", CodePart.LOGIC) == SourceSpan(
+        start=codeq.offset_of(6, 9),
+        end=codeq.offset_of(6, 17),
+        start_line=6,
+        start_column=9,
+        end_line=6,
+        end_column=17,
+    )
+    assert codeq.position(codeq.offset_of(2, 7)) == (2, 7)
+
+
+def test_line_index_tracks_edits() -> None:
+    codeq = Codeq.from_source("def run():\n    return 1\n\ndef other():\n    return 2\n")
+
+    codeq.replace(CodeKind.FUNC, "run", CodePart.LOGIC, "x = 1\ny = 2\nreturn x + y")
+    codeq.add_import("import os")
+
+    assert codeq.locate(CodeKind.FUNC, "other", CodePart.NODE).start_line == 7
+    assert codeq.position(len(codeq.source_bytes)) == (9, 1)
+
+
+def test_rewrite_applies_template_to_every_match() -> None:
+    source = dedent(
+        """
+        class Worker:
+            @ratelimit(10)
+            def run(self):
+                pass
+
+        @ratelimit(50)
+        def foo():
+            pass
+        """
+    )
+
+    codeq = Codeq.from_source(source)
+    count = codeq.rewrite(
+        """
+        (decorator
+            (call
+                function: (identifier) @name (#eq? @name "ratelimit")
+                arguments: (argument_list (integer) @limit))) @match
+        """,
+        "@throttle(per_minute=$limit)",
+    )
+
+    assert count == 2
+    assert "@throttle(per_minute=10)\n    def run" in codeq.source_bytes.decode()
+    assert "@throttle(per_minute=50)\ndef foo" in codeq.source_bytes.decode()
+
+
+def test_rewrite_rejects_unknown_placeholder_and_target() -> None:
+    codeq = Codeq.from_source("def run():\n    pass\n")
+    query = "(function_definition name: (identifier) @name) @match"
+
+    with pytest.raises(ValueError, match="placeholder 'missing'"):
+        codeq.rewrite(query, "$missing")
+
+    with pytest.raises(ValueError, match="no @node capture"):
+        codeq.rewrite(query, "x", target="node")
+
+
+def test_fork_shares_source_until_edited() -> None:
+    source = "def run():\n    return 1\n"
+    codeq = Codeq.from_source(source)
+
+    candidates = [codeq.fork() for _ in range(3)]
+    assert all(fork.source_bytes is codeq.source_bytes for fork in candidates)
+
+    for idx, fork in enumerate(candidates):
+        fork.replace(CodeKind.FUNC, "run", CodePart.LOGIC, f"return {idx + 10}")
+
+    results = [
+        fork.retrieve(CodeKind.FUNC, "run", CodePart.LOGIC) for fork in candidates
+    ]
+
+    assert results == ["return 10", "return 11", "return 12"]
+    assert codeq.source_bytes.decode() == source
+    assert codeq.retrieve(CodeKind.FUNC, "run", CodePart.LOGIC) == "return 1"
+
+
+def test_editing_parent_after_fork_leaves_fork_untouched() -> None:
+    codeq = Codeq.from_source("def run():\n    return 1\n")
+    fork = codeq.fork()
+
+    codeq.add_import("import os")
+
+    assert fork.source_bytes.decode() == "def run():\n    return 1\n"
+    assert fork.locate(CodeKind.FUNC, "run", CodePart.NODE).start_line == 1
+    assert codeq.locate(CodeKind.FUNC, "run", CodePart.NODE).start_line == 2
+
+
+def test_undo_and_redo_replay_recorded_edits() -> None:
+    source = "def run():\n    return 1\n"
+    codeq = Codeq.from_source(source)
+
+    codeq.replace(CodeKind.FUNC, "run", CodePart.LOGIC, "return 2")
+    codeq.add_import("import os")
+    edited = codeq.source_bytes.decode()
+
+    assert codeq.undo() is True
+    assert codeq.source_bytes.decode() == "def run():\n    return 2\n"
+    assert codeq.undo() is True
+    assert codeq.source_bytes.decode() == source
+    assert codeq.undo() is False
+    assert codeq.retrieve(CodeKind.FUNC, "run", CodePart.LOGIC) == "return 1"
+
+    assert codeq.redo() is True
+    assert codeq.redo() is True
+    assert codeq.redo() is False
+    assert codeq.source_bytes.decode() == edited
+    assert codeq.locate(CodeKind.FUNC, "run", CodePart.NODE).start_line == 2
+
+
+def test_new_edit_clears_redo_and_journal_size_caps_history() -> None:
+    codeq = Codeq.from_source("def run():\n    return 0\n")
+    codeq.journal_size = 2
+
+    for value in range(1, 5):
+        codeq.replace(CodeKind.FUNC, "run", CodePart.LOGIC, f"return {value}")
+
+    assert codeq.undo() and codeq.undo()
+    assert codeq.undo() is False
+    assert codeq.retrieve(CodeKind.FUNC, "run", CodePart.LOGIC) == "return 2"
+
+    codeq.replace(CodeKind.FUNC, "run", CodePart.LOGIC, "return 9")
+    assert codeq.redo() is False
+
+
+def test_rejected_edit_is_not_journaled() -> None:
+    codeq = Codeq.from_source("def run():\n    return 1\n")
+
+    with pytest.raises(InvalidEditError):
+        codeq.replace(CodeKind.FUNC, "run", CodePart.LOGIC, "return (", validate=True)
+
+    assert codeq.undo() is False
+
+
+def test_retrieve_many_returns_results_in_request_order_with_errors() -> None:
+    source = dedent(
+        """
+        def run():
+            return "top"
+
+        class Worker:
+            \"\"\"Does work\"\"\"
+
+            def run(self):
+                return "method"
+        """
+    )
+
+    codeq = Codeq.from_source(source)
+    results = codeq.retrieve_many(
+        [
+            ("func", "Worker.run", "logic"),
+            ("class", "Worker", "docstring"),
+            ("func", "run", "node"),
+            ("func", "missing", "node"),
+            ("module", "x", "node"),
+            (CodeKind.FUNC, "run", CodePart.LOGIC),
+        ]
+    )
+
+    assert [result.text for result in results] == [
+        'return "method"',
+        '"""Does work"""',
+        None,
+        None,
+        None,
+        None,
+    ]
+    assert results[0].span.start_line == 9
+    assert "Ambiguous func target 'run'" in results[2].error
+    assert results[3].error == "func 'missing' not found"
+    assert results[4].error == "Unsupported kind: 'module'"
+    assert results[5].error == results[2].error
+
+
+def test_coalesce_merges_overlapping_and_adjacent_spans() -> None:
+    source = "def a():\n    pass\n\ndef b():\n    pass\n\nx = 1\n\ndef c():\n    pass\n"
+    codeq = Codeq.from_source(source)
+
+    results = codeq.retrieve_many(
+        [("func", name, "node") for name in ("c", "a", "b")] + [("func", "a", "logic")]
+    )
+    merged = codeq.coalesce(result.span for result in results)
+
+    assert [(span.start_line, span.end_line) for span in merged] == [(1, 5), (9, 10)]
+
+
+def test_parse_limits_skip_oversized_and_slow_sources() -> None:
+    with pytest.raises(ParseLimitError, match="exceeds the 10 byte limit") as exc:
+        Codeq.from_source("def run():\n    pass\n", "big.py", ParseLimits(max_bytes=10))
+
+    assert exc.value.reason == "size"
+
+    with pytest.raises(ParseLimitError, match="parsing took longer") as exc:
+        Codeq.from_source("x = [" * 50_000, "slow.py", ParseLimits(timeout=1e-6))
+
+    assert exc.value.reason == "timeout"
+
+
+def test_broken_source_degrades_to_partial_map() -> None:
+    codeq = Codeq.from_source("def ok():\n    pass\n\ndef broken(:\n")
+
+    assert codeq.status is ParseStatus.PARTIAL
+    assert "def ok()" in codeq.file_map()
+    assert Codeq.from_source("x = 1\n").status is ParseStatus.OK
+
+
+def test_max_depth_limits_nested_definitions() -> None:
+    source = dedent(
+        """
+        def top():
+            def inner():
+                def innermost():
+                    pass
+
+        class Worker:
+            def run(self):
+                pass
+        """
+    )
+
+    limited = Codeq.from_source(source, limits=ParseLimits(max_depth=3))
+
+    assert [obj.metadata.name for obj in limited.objects()] == [
+        "top",
+        "inner",
+        "Worker",
+        "run",
+    ]
+    assert limited.status is ParseStatus.PARTIAL
+
+
+def test_max_depth_reports_partial_only_when_definitions_are_cut_off() -> None:
+    source = dedent(
+        """
+        class A:
+            class B:
+                class C:
+                    pass
+
+        @decorated
+        def top():
+            pass
+        """
+    )
+
+    limited = Codeq.from_source(source, limits=ParseLimits(max_depth=2))
+    deep_enough = Codeq.from_source(source, limits=ParseLimits(max_depth=5))
+
+    assert limited.file_map() == ["class A:", "---", "@decorated def top()"]
+    assert limited.status is ParseStatus.PARTIAL
+    assert [obj.metadata.name for obj in deep_enough.objects()] == ["A", "B", "C", "top"]
+    assert deep_enough.status is ParseStatus.OK
+
+
+def test_shrinking_journal_keeps_next_redo_record() -> None:
+    codeq = Codeq.from_source("def run():\n    return 0\n")
+
+    for value in range(1, 4):
+        codeq.replace(CodeKind.FUNC, "run", CodePart.LOGIC, f"return {value}")
+
+    assert codeq.undo() and codeq.undo() and codeq.undo()
+    codeq.journal_size = 1
+
+    assert codeq.redo() is True
+    assert codeq.redo() is False
+    assert codeq.source_bytes.decode() == "def run():\n    return 1\n"
+
+
+def test_rewrite_reads_unbraced_placeholder_up_to_the_dot() -> None:
+    codeq = Codeq.from_source("run(task)\n")
+
+    count = codeq.rewrite(
+        "(call function: (identifier) @fn arguments: (_) @args) @match",
+        "$fn.wrapped${args}",
+    )
+
+    assert count == 1
+    assert codeq.source_bytes.decode() == "run.wrapped(task)\n"
+
+
+def test_validate_points_inside_the_edit_with_character_columns() -> None:
+    codeq = Codeq.from_source("def run():\n    return 1\n")
+
+    with pytest.raises(InvalidEditError, match=r"<FILE>:2:15: ") as exc:
+        codeq.replace(
+            CodeKind.FUNC, "run", CodePart.LOGIC, "x = 'éé'; y = (", validate=True
+        )
+
+    assert (exc.value.line, exc.value.column) == (2, 15)
+    assert exc.value.text == "    x = 'éé'; y = ("
+
+
+def test_rewrite_validates_each_match_not_the_code_between_them() -> None:
+    source = (
+        "@ratelimit(5)\ndef a():\n    pass\n\n"
+        "def broken(:\n    pass\n\n"
+        "@ratelimit(10)\ndef b():\n    pass\n"
+    )
+    codeq = Codeq.from_source(source)
+    query = """
+    (decorator
+        (call
+            function: (identifier) @name (#eq? @name "ratelimit")
+            arguments: (argument_list) @args)) @match
+    """
+
+    assert codeq.rewrite(query, "@throttle${args}", validate=True) == 2
+    assert codeq.source_bytes.decode() == source.replace("@ratelimit", "@throttle")
+
+    with pytest.raises(InvalidEditError, match=r"<FILE>:1:\d+: .* '@throttle\('$"):
+        codeq.rewrite(
+            query.replace("ratelimit", "throttle"), "@throttle(", validate=True
+        )
+
+    assert codeq.source_bytes.decode() == source.replace("@ratelimit", "@throttle")
+    assert codeq.undo() is True
+    assert codeq.source_bytes.decode() == source
+    assert codeq.redo() is True
+    assert codeq.source_bytes.decode() == source.replace("@ratelimit", "@throttle")
+    assert codeq.locate(CodeKind.FUNC, "b", CodePart.NODE).start_line == 8
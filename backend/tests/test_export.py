@@ -0,0 +1,98 @@
+import io
+import json
+from pathlib import Path
+
+from codeq.export import (
+    IndexReport,
+    iter_project_resources,
+    read_binary,
+    read_ndjson,
+    write_binary,
+    write_ndjson,
+)
+from codeq.main import ParseLimits
+
+
+def _write_project(root: Path) -> None:
+    (root / "pkg").mkdir()
+    (root / "a.py").write_text(
+        'class Greeter(Base):\n    """Says hi"""\n\n'
+        '    def hello(self) -> str:\n        return "hi"\n',
+        "utf-8",
+    )
+    (root / "pkg" / "b.py").write_text("@cache\ndef run(x):\n    pass\n", "utf-8")
+
+
+def test_ndjson_export_streams_codeq_v1_resources(tmp_path: Path) -> None:
+    _write_project(tmp_path)
+    stream = io.StringIO()
+
+    count = write_ndjson(iter_project_resources(tmp_path), stream)
+
+    lines = stream.getvalue().splitlines()
+    assert count == len(lines) == 3
+    assert json.loads(lines[0]) == {
+        "apiVersion": "codeq/v1",
+        "kind": "Class",
+        "metadata": {
+            "name": "Greeter",
+            "path": str(tmp_path / "a.py"),
+            "offset": 0,
+            "line": 1,
+            "column": 1,
+        },
+        "spec": {"superclasses": "(Base)", "docstring": "Says hi"},
+    }
+    assert json.loads(lines[2])["spec"] == {
+        "params": "(x)",
+        "returnType": "",
+        "docstring": "",
+        "decorators": ["@cache"],
+    }
+
+
+def test_project_export_is_lazy(tmp_path: Path) -> None:
+    _write_project(tmp_path)
+
+    resources = iter_project_resources(tmp_path)
+    first = next(resources)
+    (tmp_path / "pkg" / "b.py").unlink()
+
+    assert first["metadata"]["name"] == "Greeter"
+    assert [item["metadata"]["name"] for item in resources] == ["hello"]
+
+
+def test_binary_export_round_trips_and_is_smaller(tmp_path: Path) -> None:
+    _write_project(tmp_path)
+    resources = list(iter_project_resources(tmp_path))
+
+    text_stream = io.StringIO()
+    write_ndjson(resources, text_stream)
+    binary_stream = io.BytesIO()
+    write_binary(resources, binary_stream)
+
+    binary_stream.seek(0)
+    text_stream.seek(0)
+    assert list(read_binary(binary_stream)) == list(read_ndjson(text_stream)) == resources
+    assert len(binary_stream.getvalue()) < len(text_stream.getvalue().encode())
+
+
+def test_project_export_reports_skipped_and_partial_files(tmp_path: Path) -> None:
+    _write_project(tmp_path)
+    (tmp_path / "broken.py").write_text("def broken(:\n", "utf-8")
+    (tmp_path / "huge.py").write_text("x = 1\n" * 1000, "utf-8")
+    report = IndexReport()
+
+    limits = ParseLimits(max_bytes=1000)
+
+    resources = list(iter_project_resources(tmp_path, limits=limits, report=report))
+
+    assert [item["metadata"]["name"] for item in resources] == [
+        "Greeter",
+        "hello",
+        "broken",
+        "run",
+    ]
+    assert (report.files, report.partial, report.skipped) == (4, 1, 1)
+    assert report.skipped_paths == {str(tmp_path / "huge.py"): "size"}
+    assert report.summary() == "4 files, 1 partial, 1 skipped"
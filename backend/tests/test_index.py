@@ -0,0 +1,149 @@
+from concurrent.futures import ProcessPoolExecutor
+import json
+from pathlib import Path
+
+import pytest
+
+from codeq.index import IndexFormatError, merge_shards, read_index, write_shard
+from codeq.main import ParseLimits
+
+
+def _write_repo(root: Path) -> None:
+    for package in ("alpha", "beta", "gamma", "delta"):
+        (root / package).mkdir()
+        for idx in range(3):
+            (root / package / f"mod{idx}.py").write_text(
+                f"def {package}_{idx}():\n    pass\n", "utf-8"
+            )
+
+
+def _build_shards(root: Path, out: Path, shards: int) -> list[Path]:
+    paths = [out / f"shard{idx}.ndjson" for idx in range(shards)]
+
+    with ProcessPoolExecutor(max_workers=shards) as executor:
+        list(
+            executor.map(
+                write_shard,
+                [root] * shards,
+                range(shards),
+                [shards] * shards,
+                paths,
+            )
+        )
+
+    return paths
+
+
+def test_shards_built_in_parallel_merge_into_deterministic_index(tmp_path: Path) -> None:
+    root = tmp_path / "repo"
+    root.mkdir()
+    _write_repo(root)
+
+    shard_paths = _build_shards(root, tmp_path, 3)
+    forward = merge_shards(shard_paths, tmp_path / "forward.ndjson")
+    merge_shards(list(reversed(shard_paths)), tmp_path / "reverse.ndjson")
+
+    assert forward.files == 12
+    assert forward.duplicates == 0
+    assert (tmp_path / "forward.ndjson").read_bytes() == (
+        tmp_path / "reverse.ndjson"
+    ).read_bytes()
+
+    header, records = read_index(tmp_path / "forward.ndjson")
+    records = list(records)
+    assert header["kind"] == "Index"
+    paths = [record.path for record in records]
+    assert paths == sorted(paths)
+    assert records[0].resources[0]["metadata"]["name"] == "alpha_0"
+
+
+def test_merge_resolves_duplicate_paths_by_content_hash(tmp_path: Path) -> None:
+    root = tmp_path / "repo"
+    root.mkdir()
+    _write_repo(root)
+
+    write_shard(root, 0, 1, tmp_path / "old.ndjson")
+    (root / "alpha" / "mod0.py").write_text("def renamed():\n    pass\n", "utf-8")
+    write_shard(root, 0, 1, tmp_path / "new.ndjson")
+
+    shards = [tmp_path / "old.ndjson", tmp_path / "new.ndjson"]
+    report = merge_shards(shards, tmp_path / "index.ndjson", root=root)
+
+    assert report.duplicates == 12
+    assert list(report.conflicts) == ["alpha/mod0.py"]
+    _, records = read_index(tmp_path / "index.ndjson")
+    merged = {record.path: record for record in records}
+    assert merged["alpha/mod0.py"].resources[0]["metadata"]["name"] == "renamed"
+
+
+def test_merge_rejects_unknown_api_version(tmp_path: Path) -> None:
+    shard = tmp_path / "shard.ndjson"
+    header = {"apiVersion": "codeq/v2", "kind": "IndexShard", "metadata": {}}
+    shard.write_text(json.dumps(header) + "\n", "utf-8")
+
+    with pytest.raises(IndexFormatError, match="unsupported apiVersion 'codeq/v2'"):
+        merge_shards([shard], tmp_path / "index.ndjson")
+
+
+def test_merge_rejects_header_that_is_not_an_object(tmp_path: Path) -> None:
+    shard = tmp_path / "shard.ndjson"
+    shard.write_text("[]\n", "utf-8")
+
+    with pytest.raises(IndexFormatError, match="header is not a JSON object"):
+        merge_shards([shard], tmp_path / "index.ndjson")
+
+
+def test_shard_headers_carry_skipped_files_into_the_merged_index(
+    tmp_path: Path,
+) -> None:
+    root = tmp_path / "repo"
+    root.mkdir()
+    _write_repo(root)
+    (root / "alpha" / "big.py").write_text("x = 1\n" * 100, "utf-8")
+
+    limits = ParseLimits(max_bytes=200)
+    paths = [tmp_path / f"shard{idx}.ndjson" for idx in range(2)]
+    for idx, path in enumerate(paths):
+        write_shard(root, idx, 2, path, limits=limits)
+
+    headers = [read_index(path)[0]["metadata"]["report"] for path in paths]
+    assert sum(header["files"] for header in headers) == 13
+    assert [header["skippedPaths"] for header in headers if header["skipped"]] == [
+        {"alpha/big.py": "size"}
+    ]
+
+    report = merge_shards(paths, tmp_path / "index.ndjson")
+
+    assert report.parse_report.summary() == "13 files, 0 partial, 1 skipped"
+    header, _ = read_index(tmp_path / "index.ndjson")
+    assert header["metadata"]["report"] == {
+        "files": 13,
+        "partial": 0,
+        "skipped": 1,
+        "skippedPaths": {"alpha/big.py": "size"},
+    }
+
+
+def test_merge_rejects_missing_or_mismatched_shards(tmp_path: Path) -> None:
+    root = tmp_path / "repo"
+    root.mkdir()
+    _write_repo(root)
+
+    for idx in range(3):
+        write_shard(root, idx, 3, tmp_path / f"shard{idx}.ndjson")
+
+    write_shard(root, 0, 2, tmp_path / "other.ndjson")
+
+    with pytest.raises(IndexFormatError, match=r"Missing shards \[2\] of 3"):
+        merge_shards(
+            [tmp_path / "shard0.ndjson", tmp_path / "shard1.ndjson"],
+            tmp_path / "index.ndjson",
+        )
+
+    with pytest.raises(IndexFormatError, match="shard total 2 does not match 3"):
+        merge_shards(
+            [tmp_path / "shard0.ndjson", tmp_path / "other.ndjson"],
+            tmp_path / "index.ndjson",
+        )
+
+    assert not (tmp_path / "index.ndjson").exists()
@@ -0,0 +1,131 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from llm_cache import CACHE_DIR_ENV, CompletionCache
+
+
+class FakeCompletion:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self, model: str, messages: list[dict[str, Any]], **params: Any) -> dict:
+        self.calls += 1
+
+        return {"model": model, "content": f"answer {self.calls}"}
+
+
+def test_deterministic_calls_are_served_from_cache(tmp_path: Path) -> None:
+    cache = CompletionCache(tmp_path)
+    fake = FakeCompletion()
+    completion = cache.wrap(fake)
+    messages = [{"role": "user", "content": "Patch main():\n    return 1\n"}]
+
+    first = completion(model="m", messages=messages, temperature=0)
+    second = completion(
+        model="m",
+        messages=[{"role": "user", "content": "Patch main():  \r\n    return 1\r\n"}],
+        temperature=0,
+        timeout=30,
+    )
+
+    assert first == second == {"model": "m", "content": "answer 1"}
+    assert fake.calls == 1
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.entries) == (1, 1, 1)
+    assert stats.hit_rate == 0.5
+
+
+def test_sampling_parameters_are_part_of_the_key(tmp_path: Path) -> None:
+    cache = CompletionCache(tmp_path)
+    fake = FakeCompletion()
+    completion = cache.wrap(fake)
+    messages = [{"role": "user", "content": "hi"}]
+
+    completion(model="m", messages=messages, temperature=0)
+    completion(model="m", messages=messages, temperature=0, max_tokens=10)
+    completion(model="other", messages=messages, temperature=0)
+
+    assert fake.calls == 3
+
+
+def test_non_deterministic_calls_bypass_cache(tmp_path: Path) -> None:
+    cache = CompletionCache(tmp_path)
+    fake = FakeCompletion()
+    completion = cache.wrap(fake)
+    messages = [{"role": "user", "content": "hi"}]
+
+    completion(model="m", messages=messages, temperature=0.7)
+    completion(model="m", messages=messages, temperature=0.7)
+    completion(model="m", messages=messages, temperature=0.7, seed=1)
+    completion(model="m", messages=messages, temperature=0.7, seed=1)
+
+    assert fake.calls == 3
+    assert cache.stats().bypassed == 2
+
+
+def test_lru_eviction_keeps_cache_under_size_limit(tmp_path: Path) -> None:
+    cache = CompletionCache(tmp_path, max_bytes=100)
+    payload = {"content": "x" * 30}
+
+    cache.put("a", payload)
+    cache.put("b", payload)
+    assert cache.get("a") == payload
+    cache.put("c", payload)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == payload
+    assert cache.get("c") == payload
+
+    stats = cache.stats()
+    assert stats.evictions == 1
+    assert stats.size_bytes <= 100
+
+
+def test_cache_persists_across_instances_and_is_opt_in(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.delenv(CACHE_DIR_ENV, raising=False)
+    assert CompletionCache.from_env() is None
+
+    monkeypatch.setenv(CACHE_DIR_ENV, str(tmp_path))
+    first = CompletionCache.from_env()
+    assert first is not None
+    first.put("key", {"content": "cached"})
+    first.close()
+
+    second = CompletionCache.from_env()
+    assert second is not None
+    assert second.get("key") == {"content": "cached"}
+
+
+def test_key_keeps_indentation_and_exact_stop_sequences() -> None:
+    def key(content: str, **params: Any) -> str:
+        return CompletionCache.key("m", [{"role": "user", "content": content}], **params)
+
+    assert key("    return 1") != key("return 1")
+    assert len({key("x", stop=[stop]) for stop in ("\n", "\n\n", " ")}) == 3
+
+
+def test_key_includes_unknown_parameters_and_skips_transport_ones() -> None:
+    messages = [{"role": "user", "content": "x"}]
+    base = CompletionCache.key("m", messages, temperature=0)
+
+    for name, first, second in (
+        ("api_base", "http://a", "http://b"),
+        ("reasoning_effort", "low", "high"),
+        ("logit_bias", {"50256": -100}, {"50256": 100}),
+        ("some_future_param", 1, 2),
+    ):
+        assert CompletionCache.key(
+            "m", messages, temperature=0, **{name: first}
+        ) != CompletionCache.key("m", messages, temperature=0, **{name: second})
+
+    assert (
+        CompletionCache.key(
+            "m", messages, temperature=0, api_key="secret", timeout=30, num_retries=3
+        )
+        == base
+    )
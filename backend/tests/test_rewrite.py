@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import pytest
+
+from codeq.rewrite import rewrite_paths
+
+RATELIMIT_QUERY = """
+(decorator
+    (call
+        function: (identifier) @name (#eq? @name "ratelimit")
+        arguments: (argument_list) @args)) @match
+"""
+
+
+def _write_modules(root: Path, count: int) -> None:
+    for idx in range(count):
+        (root / f"mod{idx}.py").write_text(
+            "@ratelimit(5)\ndef a():\n    pass\n\n@ratelimit(10)\ndef b():\n    pass\n",
+            "utf-8",
+        )
+
+    (root / "plain.py").write_text("def c():\n    pass\n", "utf-8")
+
+
+def test_rewrite_paths_rewrites_every_file_in_parallel(tmp_path: Path) -> None:
+    _write_modules(tmp_path, 4)
+
+    report = rewrite_paths(tmp_path, RATELIMIT_QUERY, "@throttle${args}", workers=2)
+
+    assert report.matches == 8
+    assert report.changed_files == 4
+    assert report.errors == []
+    assert (tmp_path / "mod0.py").read_text("utf-8") == (
+        "@throttle(5)\ndef a():\n    pass\n\n@throttle(10)\ndef b():\n    pass\n"
+    )
+
+
+def test_rewrite_paths_dry_run_reports_diff_without_writing(tmp_path: Path) -> None:
+    _write_modules(tmp_path, 1)
+
+    report = rewrite_paths(tmp_path, RATELIMIT_QUERY, "@throttle${args}", dry_run=True)
+
+    assert report.matches == 2
+    [changed] = [item for item in report.files if item.matches]
+    assert "-@ratelimit(5)\n+@throttle(5)\n" in changed.diff
+    assert (tmp_path / "mod0.py").read_text("utf-8").startswith("@ratelimit(5)")
+
+
+def test_rewrite_paths_reports_invalid_output_per_file(tmp_path: Path) -> None:
+    _write_modules(tmp_path, 1)
+
+    report = rewrite_paths(tmp_path, RATELIMIT_QUERY, "@throttle(", workers=1)
+
+    assert report.matches == 0
+    assert [item.path for item in report.errors] == [str(tmp_path / "mod0.py")]
+    assert (tmp_path / "mod0.py").read_text("utf-8").startswith("@ratelimit(5)")
+
+
+def test_rewrite_paths_rejects_invalid_query(tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match="Invalid query"):
+        rewrite_paths(tmp_path, "(decorator", "x")
@@ -0,0 +1,113 @@
+from pathlib import Path
+import threading
+
+import pytest
+
+from codeq.main import Codeq
+from codeq.scheduler import CodemodScheduler, QueueFullError
+
+
+def test_jobs_on_same_file_are_serialized_and_keep_every_edit(tmp_path: Path) -> None:
+    target = tmp_path / "module.py"
+    target.write_text("", "utf-8")
+
+    def add(idx: int):
+        return lambda codeq: codeq.add_import(f"import mod{idx}")
+
+    with CodemodScheduler(max_workers=4) as scheduler:
+        futures = [scheduler.submit(target, add(idx)) for idx in range(20)]
+        assert all(future.result(timeout=5) for future in futures)
+
+    lines = target.read_text("utf-8").splitlines()
+    assert sorted(lines) == sorted(f"import mod{idx}" for idx in range(20))
+
+
+def test_jobs_on_different_files_run_in_parallel(tmp_path: Path) -> None:
+    first = tmp_path / "first.py"
+    second = tmp_path / "second.py"
+    first.write_text("x = 1\n", "utf-8")
+    second.write_text("y = 2\n", "utf-8")
+
+    barrier = threading.Barrier(2, timeout=5)
+
+    def wait_for_peer(_codeq: Codeq) -> bool:
+        barrier.wait()
+        return True
+
+    with CodemodScheduler(max_workers=2) as scheduler:
+        futures = [
+            scheduler.submit(first, wait_for_peer, write=False),
+            scheduler.submit(second, wait_for_peer, write=False),
+        ]
+
+        assert [future.result(timeout=5) for future in futures] == [True, True]
+
+
+def test_submit_applies_backpressure_when_queue_is_full(tmp_path: Path) -> None:
+    target = tmp_path / "module.py"
+    target.write_text("x = 1\n", "utf-8")
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocker(_codeq: Codeq) -> None:
+        started.set()
+        release.wait(5)
+
+    with CodemodScheduler(max_workers=1, max_queue=1) as scheduler:
+        scheduler.submit(target, blocker, write=False)
+        started.wait(5)
+        scheduler.submit(target, lambda _codeq: None, write=False)
+
+        with pytest.raises(QueueFullError, match="queue is full"):
+            scheduler.submit(target, lambda _codeq: None, block=False)
+
+        with pytest.raises(QueueFullError, match="after waiting"):
+            scheduler.submit(target, lambda _codeq: None, timeout=0.01)
+
+        assert scheduler.stats().queued == 1
+        release.set()
+
+    stats = scheduler.stats()
+    assert stats.queued == 0
+    assert stats.completed == 2
+    assert stats.max_wait >= stats.avg_wait > 0
+
+
+def test_failed_job_surfaces_error_and_skips_write(tmp_path: Path) -> None:
+    target = tmp_path / "module.py"
+    target.write_text("def run():\n    return 1\n", "utf-8")
+
+    def broken(codeq: Codeq) -> None:
+        codeq.replace("func", "run", "logic", "return 2")
+        codeq.replace("func", "missing", "logic", "return 3")
+
+    with CodemodScheduler() as scheduler:
+        future = scheduler.submit(target, broken)
+
+        with pytest.raises(Exception, match="func 'missing' not found"):
+            future.result(timeout=5)
+
+    assert scheduler.stats().failed == 1
+    assert target.read_text("utf-8") == "def run():\n    return 1\n"
+
+
+def test_cancelled_queued_job_is_not_counted_as_failure(tmp_path: Path) -> None:
+    target = tmp_path / "module.py"
+    target.write_text("x = 1\n", "utf-8")
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocker(_codeq: Codeq) -> None:
+        started.set()
+        release.wait(5)
+
+    with CodemodScheduler(max_workers=1) as scheduler:
+        scheduler.submit(target, blocker, write=False)
+        started.wait(5)
+        queued = scheduler.submit(target, lambda _codeq: None, write=False)
+
+        assert queued.cancel() is True
+        release.set()
+
+    stats = scheduler.stats()
+    assert (stats.completed, stats.failed, stats.cancelled) == (1, 0, 1)